@@ -0,0 +1,185 @@
+"""Play rounds of skat with asyncio, many at once.
+
+play_skat's driver waits on one player at a time, which is all a local bot
+needs.  A bot behind a pipe or socket, though, spends most of each decision
+waiting on I/O, during which other rounds could be getting on.  Here the
+round driver is a coroutine, so that one process can keep any number of
+rounds in flight and throughput is limited by the bots, not by round trips:
+  AsyncRound: A Round whose get_ methods are coroutines.
+  play_one_round(): The coroutine version of play_skat.play_one_round().
+  play_concurrently(): Play a range of rounds, at most so many at a time.
+
+Rounds in flight finish in any order, so each one's output is held back until
+those before it are written (see RoundOutput), as if they were played one
+after another.
+
+A player's methods may be coroutines (e.g. remote_player.AsyncRemotePlayer)
+or ordinary functions, as for any other player; the latter are simply called.
+"""
+
+import asyncio
+import inspect
+import io
+import sys
+from skat_classes import *
+from skat_events import make_sink
+from play_skat import deal, round_steps
+
+async def resolve(decision):
+    """Return a player's decision, awaiting it if it is awaitable."""
+    if inspect.isawaitable(decision):
+        return await decision
+    return decision
+
+
+class AsyncRound(Round):
+    """A Round whose get_ methods are coroutines (see Round).
+
+    Under a time control (see Round.set_time_control()), a player's
+    coroutine is cancelled at the deadline and the fallback move made
+    instead; an ordinary function can't be interrupted, so it only has its
+    time charged to its clock.
+    """
+
+    async def ask(self, p, seat, method, view, fallback):
+        """Return what AI p's method (str) decides for seat (see Round)."""
+        limit = self.decision_limit(seat)
+        if limit is None:
+            return await resolve(getattr(p, method)(view, self))
+
+        start = self.start_decision(limit)
+        try:
+            decision = getattr(p, method)(view, self)
+            if not inspect.isawaitable(decision):
+                return decision
+            if limit <= 0:
+                if inspect.iscoroutine(decision):
+                    decision.close() # Never to be awaited
+                return self.fall_back(seat, method, fallback)
+            try:
+                return await asyncio.wait_for(decision, limit)
+            except asyncio.TimeoutError:
+                return self.fall_back(seat, method, fallback)
+        finally:
+            self.end_decision(seat, start)
+
+    async def get_bid(self, p, i):
+        return self.apply_bid(i, await self.ask(p, i, 'bid', self.h[i],
+                                                lambda: False))
+
+    async def get_kitty_declaration(self, p, i):
+        return self.apply_kitty_declaration(
+            i, await self.ask(p, i, 'kitty', self.h[i].cards, lambda: True))
+
+    async def get_kitty_discards(self, p):
+        self.apply_kitty_discards(await self.ask(p, self.declarer, 'discard',
+                                                 self.h[self.declarer],
+                                                 self.random_discards))
+
+    async def get_declaration(self, p):
+        self.apply_declaration(await self.ask(p, self.declarer, 'declare',
+                                              self.h[self.declarer],
+                                              lambda: ['grand']))
+
+    async def get_play(self, p):
+        self.play_card(await self.ask(p, self.whoseTurn, 'play',
+                                      self.h[self.whoseTurn],
+                                      self.random_play))
+
+
+class RoundOutput:
+    """Write the output of rounds in order, whatever order they finish in.
+
+    Each round in flight prints to a buffer of its own (see buffer()), which
+    is handed to finish() when the round is over.
+
+    pending (dict): Output (str) of finished rounds not yet written, by
+      index.
+    nextRound (int): Index of the next round to write.
+    """
+
+    def __init__(self):
+        self.pending = {}
+        self.nextRound = 0
+
+    def buffer(self):
+        """Return a new buffer (file object) for a round in flight to use."""
+        return io.StringIO()
+
+    def finish(self, i, buffer):
+        """Take round i's output from a buffer (emptied for the next round).
+
+        Writes it to whatever sys.stdout is at the time, along with any
+        later rounds' that were waiting for it.
+        """
+        self.pending[i] = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        while self.nextRound in self.pending:
+            sys.stdout.write(self.pending.pop(self.nextRound))
+            self.nextRound += 1
+
+async def play_one_round(players, names, verbosity, r=None, deck=None,
+                         seed=None):
+    """Play and return the scores (list of int) for one round.
+
+    Arguments are as for play_skat.play_one_round(), but r, if given, must be
+    an AsyncRound.  The round follows play_skat's rules (round_steps()),
+    awaiting the players.
+    """
+    if r is None:
+        r = AsyncRound(names, verbosity)
+    deal(r, names, verbosity, deck, seed)
+    for i, p in enumerate(players):
+        p.reset(i)
+        await resolve(p.assess_hand(r))
+
+    steps = round_steps(r, players)
+    result = None
+    try:
+        while True:
+            method, args = steps.send(result)
+            result = await method(*args)
+    except StopIteration as finished:
+        return finished.value
+
+async def play_concurrently(make_players, names, verbosity, rounds,
+                            concurrency, timeControl=(None, None),
+                            record=None):
+    """Play rounds, at most concurrency (int) at once; return their results.
+
+    make_players (function): Returns a new list of players, one per seat.
+      Each round in flight needs its own, so it is called concurrency times.
+    rounds (iterable): Per round, a tuple of the seat order (a permutation
+      of range(3), see skat_wrapper.PERMUTATIONS) and the seed.
+    timeControl (tuple): See Round.set_time_control().
+    record (function): If given, called with each finished Round and its
+      scores, e.g. game_record.pack_round().
+
+    Returns a list, in the order of rounds, of tuples of each round's scores
+    (list of int), timeouts (see Round.timeouts), and what record returned
+    (None without record).  What the rounds print is written in their order.
+    """
+    rounds = list(rounds)
+    results = [None] * len(rounds)
+    queue = iter(range(len(rounds)))
+    output = RoundOutput()
+
+    async def lane():
+        """Play rounds one after another until there are none left."""
+        players = make_players()
+        buffer = output.buffer()
+        r = AsyncRound(names, verbosity, make_sink(verbosity, buffer))
+        r.set_time_control(*timeControl)
+        for i in queue: # Shared with the other lanes
+            permutation, seed = rounds[i]
+            scores = await play_one_round([players[p] for p in permutation],
+                                          [names[p] for p in permutation],
+                                          verbosity, r, seed=seed)
+            results[i] = (scores, list(r.timeouts),
+                          None if record is None else record(r, scores))
+            output.finish(i, buffer)
+
+    await asyncio.gather(*(lane() for _ in range(min(concurrency,
+                                                     len(rounds)))))
+    return results
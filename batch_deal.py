@@ -0,0 +1,94 @@
+"""Vectorized dealing and hand evaluation for many rounds at once.
+
+Intended for offline studies of bidding heuristics over millions of deals,
+where dealing and evaluating one Round at a time is far too slow.  Decks are
+NumPy arrays of card indices and hands are arrays of masks (see skat_classes),
+and every feature is computed for the whole batch with table lookups.
+
+Requires NumPy, which the rest of the package does not.
+"""
+
+import numpy as np
+from skat_classes import *
+from bot_utils import count_certain_tricks
+
+HAND_SIZE = 10
+ACE_MASK  = cards_to_mask(['a' + suit for suit in SUITS])
+
+_POPCOUNT = np.array([bin(byte).count('1') for byte in range(256)],
+                     dtype=np.int8)
+
+def _suit_trick_table(gameType, slot):
+    """Return count_certain_tricks() of every possible byte of a suit slot."""
+    slotByte = SLOT_MASKS[gameType][slot] >> 8 * slot
+    return np.array([count_certain_tricks(mask_to_cards(byte & slotByte),
+                                          gameType == 'null')
+                     for byte in range(256)], dtype=np.int8)
+
+# Lookup tables per game type: jack multiplier by trump key (suit and grand
+# games only) and certain tricks by suit slot byte.
+JACK_TABLES  = {gameType: np.array(JACK_MULTIPLIERS[gameType], dtype=np.int8)
+                for gameType in JACK_MULTIPLIERS}
+TRICK_TABLES = {gameType: [_suit_trick_table(gameType, slot)
+                           for slot in range(len(SUITS))]
+                for gameType in GAMES}
+
+def popcount(masks):
+    """Return the number of cards (array of int) in each mask."""
+    masks = masks.astype(np.uint32)
+    return (_POPCOUNT[masks & 0xff] + _POPCOUNT[masks >> 8 & 0xff] +
+            _POPCOUNT[masks >> 16 & 0xff] + _POPCOUNT[masks >> 24])
+
+def deal_batch(n, seed=None):
+    """Return n shuffled decks as an (n, 32) array of card indices.
+
+    Like Round.generate_deck, deck[:10], deck[10:20], and deck[20:30] are the
+    three hands, and deck[30:] is the kitty.
+    """
+    rng = np.random.default_rng(seed)
+    decks = np.tile(np.arange(len(CARDS), dtype=np.int8), (n, 1))
+    return rng.permuted(decks, axis=1)
+
+def deck_masks(decks):
+    """Return the masks of the hands and kitty, an (n, 4) uint32 array."""
+    bits = np.left_shift(np.uint32(1), decks.astype(np.uint32))
+    bounds = [0, HAND_SIZE, 2 * HAND_SIZE, 3 * HAND_SIZE, len(CARDS)]
+    return np.stack([bits[:, bounds[i]:bounds[i + 1]].sum(axis=1,
+                                                          dtype=np.uint32)
+                     for i in range(len(bounds) - 1)], axis=1)
+
+def trump_keys(masks, gameType):
+    """Return the trump_key() (array of int) of each mask for a game type."""
+    masks = masks.astype(np.uint32)
+    keys = ((masks >> 7 & 1) | (masks >> 14 & 2) | (masks >> 21 & 4) |
+            (masks >> 28 & 8)) << 7
+    if gameType != 'grand' and gameType != 'null':
+        keys |= masks >> 8 * SUITS.find(gameType[0]) & 0x7f
+    return keys
+
+def evaluate_hands(masks):
+    """Return bidding features (dict of arrays) of each mask in an array.
+
+    masks (array of int): Any shape, e.g. from deck_masks().  To evaluate a
+      declarer's hand including the kitty, pass hand | kitty.
+
+    The result maps 'aces' and 'jacks' to card counts, and each game type to
+    a dict with 'trumps' (count), 'jackMultiplier' (see jack_multiplier(); 0
+    for null), and 'certainTricks' (count_certain_tricks() of each of the
+    four suits, in a trailing axis of length 4).
+    """
+    masks = masks.astype(np.uint32)
+    features = {'aces': popcount(masks & ACE_MASK),
+                'jacks': popcount(masks & JACK_MASK)}
+    for gameType in GAMES:
+        game = features[gameType] = {}
+        game['trumps'] = popcount(masks & TRUMP_MASKS[gameType])
+        if gameType == 'null':
+            game['jackMultiplier'] = np.zeros(masks.shape, dtype=np.int8)
+        else:
+            game['jackMultiplier'] = \
+                JACK_TABLES[gameType][trump_keys(masks, gameType)]
+        game['certainTricks'] = np.stack(
+            [TRICK_TABLES[gameType][slot][masks >> 8 * slot & 0xff]
+             for slot in range(len(SUITS))], axis=-1)
+    return features
@@ -0,0 +1,278 @@
+"""Play many rounds of skat in lockstep, for batched (e.g. neural) players.
+
+A Round asks a player for one decision at a time, which for a model that
+evaluates positions in batches wastes most of each call.  Here many rounds
+are advanced together instead: whenever every round is waiting on a player,
+the decisions of the same kind waiting on the same batch player are gathered
+into one call, e.g. play_batch(states, legal), which answers them all.
+
+A batch player is any object with the methods
+    bid_batch, kitty_batch, discard_batch, declare_batch, play_batch
+each taking two arrays, with one row per decision:
+  states (array('Q')): STATE_FIELDS ints per decision, in that order (see
+    encode_state()); e.g. numpy.frombuffer(states, numpy.uint64).reshape(
+    -1, len(STATE_FIELDS)).
+  legal (array('Q')): One mask per decision of what may be chosen:
+    bid: bit i for BIDS[i] (see game_record).
+    kitty: bit 0 to skip the kitty, bit 1 to take it.
+    discard: The cards that may be discarded (the declarer's hand).
+    declare: bit i for GAMES[i] (see legal_games()).
+    play: The cards that may be played (see Round.legal_mask()).
+and returning a sequence of ints, one per decision: the chosen BIDS index,
+0 or 1, a mask of the two cards to discard, the GAMES index (no extras are
+called), or the card index (see CARDS) to play.  Batch players are shared by
+every round in flight, so they keep no per-round state.
+
+Ordinary players can sit at the same table; each round in flight has its
+own, and they are simply called (see make_players in play_lockstep()).
+
+The rounds are played by async_skat's coroutines, driven here by hand
+rather than by an event loop, so the rounds and rules are exactly those of
+the other drivers.  There are no time controls.
+"""
+
+from array import array
+from skat_classes import *
+from game_record import BIDS, NO_DECLARER
+from skat_events import make_sink
+from async_skat import AsyncRound, RoundOutput, play_one_round
+
+STATE_FIELDS = ('seat', 'hand', 'played', 'trick', 'trickSize', 'leader',
+                'declarer', 'gameType', 'currentBid', 'kitty')
+NO_GAME = len(GAMES) # gameType before the game is declared
+_BID_CODES = {bid: code for code, bid in enumerate(BIDS)}
+_OK_OR_PASS = 1 << _BID_CODES[False] | 1 << _BID_CODES[True]
+
+def encode_state(r, seat):
+    """Return what seat may know of a Round (tuple of STATE_FIELDS ints).
+
+    hand, played (int): Masks of the seat's cards and the cards played so
+      far (including the current trick).
+    trick (int): The card indices of the current trick, 6 bits apiece, first
+      card lowest; trickSize (int) is how many there are.
+    leader, declarer (int): Seats (NO_DECLARER before there is one).
+    gameType (int): Index in GAMES (NO_GAME before it is declared).
+    currentBid (int): As in Round.
+    kitty (int): Mask of the kitty if the seat has seen it (as the declarer
+      who picked it up), otherwise 0.
+    """
+    trick = 0
+    for i, card in enumerate(r.currentTrick):
+        trick |= CARD_INDICES[card] << 6 * i
+    declarer = NO_DECLARER if r.declarer is None else r.declarer
+    gameType = GAMES.index(r.declaration[0]) \
+               if r.declaration and r.declaration[0] in GAMES else NO_GAME
+    seenKitty = seat == r.declarer and 'no kitty' not in r.declaration
+    return (seat, r.h[seat].mask, FULL_DECK & ~r.cardsLeftMask, trick,
+            len(r.currentTrick), r.leader, declarer, gameType, r.currentBid,
+            cards_to_mask(r.kitty) if seenKitty else 0)
+
+def legal_bids(r):
+    """Return the mask of the BIDS codes the bidder may bid (int)."""
+    if r.bidHistory and type(r.bidHistory[-1]) is int:
+        return _OK_OR_PASS # Answer a bid.
+    mask = 1 << _BID_CODES[False]
+    for bid in LEGAL_BIDS:
+        if bid > r.currentBid:
+            mask |= 1 << _BID_CODES[bid]
+    return mask
+
+def legal_games(r):
+    """Return the mask of the GAMES indices the declarer may declare (int).
+
+    A null game's value doesn't depend on the cards, so it can't be declared
+    once the bidding has gone past it.
+    """
+    mask = (1 << len(GAMES)) - 1
+    if game_value(['null'] + r.declaration, False) < r.currentBid:
+        mask &= ~(1 << GAMES.index('null'))
+    return mask
+
+# Per method: the legal mask of a decision (function of Round and seat), and
+# how to turn a batch player's int answer into what the Round expects.
+LEGAL_MASKS = {'bid': lambda r, seat: legal_bids(r),
+               'kitty': lambda r, seat: 0b11,
+               'discard': lambda r, seat: r.h[seat].mask,
+               'declare': lambda r, seat: legal_games(r),
+               'play': lambda r, seat: r.legal_mask(r.h[seat])}
+DECODERS = {'bid': lambda answer: BIDS[answer],
+            'kitty': bool,
+            'discard': mask_to_cards,
+            'declare': lambda answer: [GAMES[answer]],
+            'play': lambda answer: CARDS[answer]}
+
+
+class Decision:
+    """A decision a round is waiting on, until a batch answers it.
+
+    Awaiting a Decision suspends the round's coroutine (see play_lockstep())
+    and returns the answer it is eventually given.
+    """
+
+    __slots__ = ('player', 'method', 'r', 'seat', 'answer')
+
+    def __init__(self, player, method, r, seat):
+        self.player = player
+        self.method = method
+        self.r = r
+        self.seat = seat
+        self.answer = None
+
+    def __await__(self):
+        yield self
+        return self.answer
+
+
+class BatchSeat:
+    """Stand in for a batch player at one table, turning calls into Decisions.
+
+    player (obj): The batch player, shared with every other table.
+    """
+
+    def __init__(self, player):
+        self.player = player
+
+    def reset(self, seat):
+        self.seat = seat
+
+    def assess_hand(self, r):
+        pass
+
+    def bid(self, _, r):
+        return Decision(self.player, 'bid', r, self.seat)
+
+    def kitty(self, _, r):
+        return Decision(self.player, 'kitty', r, self.seat)
+
+    def discard(self, _, r):
+        return Decision(self.player, 'discard', r, self.seat)
+
+    def declare(self, _, r):
+        return Decision(self.player, 'declare', r, self.seat)
+
+    def play(self, _, r):
+        return Decision(self.player, 'play', r, self.seat)
+
+
+def answer_batch(player, method, decisions):
+    """Ask a batch player for a batch of decisions of one kind at once."""
+    states, legal = array('Q'), array('Q')
+    for decision in decisions:
+        states.extend(encode_state(decision.r, decision.seat))
+        legal.append(LEGAL_MASKS[method](decision.r, decision.seat))
+    answers = getattr(player, method + '_batch')(states, legal)
+    decode = DECODERS[method]
+    for decision, answer in zip(decisions, answers):
+        decision.answer = decode(int(answer))
+
+def play_lockstep(make_players, names, rounds, batchSize,
+                  verbosity='silent', record=None):
+    """Play rounds, up to batchSize (int) in lockstep; return their results.
+
+    make_players (function): Returns a list of players, one per seat; batch
+      players (those with a play_batch method) may be the same objects every
+      time, but each round in flight needs its own ordinary players.
+    names, verbosity, record: As for async_skat.play_concurrently().
+    rounds (iterable): Per round, a tuple of the seat order and the seed, as
+      for async_skat.play_concurrently().
+
+    Returns a list, in the order of rounds, of tuples of each round's scores
+    (list of int) and what record returned (None without record).  What the
+    rounds print is written in their order.
+    """
+    rounds = list(rounds)
+    results = [None] * len(rounds)
+    queue = iter(range(len(rounds)))
+    output = RoundOutput()
+
+    class Table:
+        """One round in flight, and the players and Round it reuses."""
+        def __init__(self):
+            self.players = [BatchSeat(p) if hasattr(p, 'play_batch') else p
+                            for p in make_players()]
+            self.buffer = output.buffer()
+            self.r = AsyncRound(names, verbosity,
+                                make_sink(verbosity, self.buffer))
+            self.waiting = None # The Decision the round is waiting on
+            if self.start_round():
+                self.advance(None)
+
+        def start_round(self):
+            """Start the next round, if any; return whether there was one."""
+            self.i = next(queue, None)
+            if self.i is None:
+                return False
+            permutation, seed = rounds[self.i]
+            self.round = play_one_round([self.players[p]
+                                         for p in permutation],
+                                        [names[p] for p in permutation],
+                                        verbosity, self.r, seed=seed)
+            return True
+
+        def advance(self, answer):
+            """Run rounds until one waits on a Decision or none are left."""
+            while True:
+                try:
+                    self.waiting = self.round.send(answer)
+                    return
+                except StopIteration as finished:
+                    scores = finished.value
+                    results[self.i] = (scores, None if record is None
+                                       else record(self.r, scores))
+                    output.finish(self.i, self.buffer)
+                self.waiting = None
+                if not self.start_round():
+                    return
+                answer = None
+
+    tables = [Table() for _ in range(min(batchSize, len(rounds)))]
+    while True:
+        # Everyone is waiting: gather the same decisions of the same player.
+        batches = {}
+        for table in tables:
+            decision = table.waiting
+            if decision is not None:
+                batches.setdefault((id(decision.player), decision.method),
+                                   []).append(table)
+        if not batches:
+            return results
+        for waiting in batches.values():
+            decision = waiting[0].waiting
+            answer_batch(decision.player, decision.method,
+                         [table.waiting for table in waiting])
+            for table in waiting:
+                table.advance(table.waiting.answer)
+
+
+class RandomBatchPlayer:
+    """A batch player that decides at random, as an example and baseline.
+
+    Like Kenny, it passes half the time in the bidding and otherwise makes
+    the lowest legal bid, always takes the kitty, and plays a random legal
+    card, but it discards and declares at random too.
+
+    rng (obj): The random.Random it draws from.
+    """
+
+    def __init__(self, seed=None):
+        self.rng = random.Random(seed)
+
+    def bid_batch(self, states, legal):
+        # The lowest set bit after pass (bit 0) is OK or the lowest bid.
+        return [self.rng.getrandbits(1) and
+                (mask >> 1 & -(mask >> 1)).bit_length() for mask in legal]
+
+    def kitty_batch(self, states, legal):
+        return [1] * len(legal)
+
+    def discard_batch(self, states, legal):
+        return [cards_to_mask(self.rng.sample(mask_to_cards(mask), 2))
+                for mask in legal]
+
+    def declare_batch(self, states, legal):
+        return [self.rng.choice([i for i in range(len(GAMES))
+                                 if mask >> i & 1]) for mask in legal]
+
+    def play_batch(self, states, legal):
+        return [CARD_INDICES[self.rng.choice(mask_to_cards(mask))]
+                for mask in legal]
@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+"""Benchmarks of the engine and the bundled players.
+
+Command-line arguments (see usage):
+  --rounds: Rounds to play per player
+  --seed: Seed for the rounds (see skat_wrapper.round_seed())
+  --players: Which players to benchmark, each against two copies of itself
+  --output: JSON file to write the results to
+  --baseline: Earlier JSON results to compare against
+
+For each player, plays rounds the way play_one_round() does, phase by phase
+(see play_skat), timing each phase: setup (deal and assess_hand), bidding,
+declaring, check_overbid, trick_taking, and scoring.  Then times a few engine
+operations in isolation: legal_plays, next_turn, jack_multiplier,
+Hand.reorganize (with the cards view it rebuilds), and flatten.
+
+The results are written as JSON, so runs can be compared over time:
+  rounds, seed, python: How the run was made.
+  players: Per player, roundsPerSec (float) and phases: mean microseconds
+    per round of each phase (dict).
+  operations: Mean nanoseconds per call of each engine operation (dict).
+"""
+
+import argparse
+import json
+import platform
+import time
+from play_skat import setup, bidding, declaring, trick_taking, scoring
+from skat_classes import *
+from skat_wrapper import make_player, round_seed
+
+PLAYERS = ('kenny', 'bob', 'nihilist')
+PHASES  = ('setup', 'bidding', 'declaring', 'check_overbid', 'trick_taking',
+           'scoring')
+N_CALLS = 20000 # Calls per timing of an engine operation
+N_CARDS_PLAYED = 30 # Per round, excluding the kitty
+SLOWER  = 1.1   # Ratio to the baseline that counts as a regression
+
+def parse_args():
+    """Parse and return the command-line arguments (argparse.Namespace)."""
+    parser = argparse.ArgumentParser(
+        description='Benchmark the skat engine and players.')
+    parser.add_argument('--rounds', type=int, default=6000,
+                        help='rounds per player (default %(default)s)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed for the rounds (default %(default)s)')
+    parser.add_argument('--players', nargs='+', default=PLAYERS,
+                        choices=PLAYERS, help='players to benchmark')
+    parser.add_argument('--output', default='benchmark.json',
+                        help='file for the results (default %(default)s)')
+    parser.add_argument('--baseline',
+                        help='earlier results to compare against')
+    return parser.parse_args()
+
+def time_rounds(name, nRounds, seed):
+    """Play rounds between three copies of a player; return their timings.
+
+    Returns rounds per second (float) and the mean microseconds per round of
+    each phase (dict).
+    """
+    players = [make_player(name, i) for i in range(N_PLAYERS)]
+    names = [name] * N_PLAYERS
+    r = Round(names, 'silent')
+    totals = dict.fromkeys(PHASES, 0.0)
+    clock = time.perf_counter
+
+    start = clock()
+    for i in range(nRounds):
+        t0 = clock()
+        setup(players, names, 'silent', r, seed=round_seed(seed, i))
+        t1 = clock()
+        declarer = bidding(r, players)
+        t2 = clock()
+        declaring(r, players, declarer)
+        t3 = clock()
+        overbid = r.check_overbid()
+        t4 = clock()
+        totals['setup'] += t1 - t0
+        totals['bidding'] += t2 - t1
+        totals['declaring'] += t3 - t2
+        totals['check_overbid'] += t4 - t3
+        if overbid:
+            continue
+        trick_taking(r, players)
+        t5 = clock()
+        scoring(r)
+        t6 = clock()
+        totals['trick_taking'] += t5 - t4
+        totals['scoring'] += t6 - t5
+    elapsed = clock() - start
+
+    return nRounds / elapsed, {phase: 1e6 * total / nRounds
+                               for phase, total in totals.items()}
+
+def played_rounds(nRounds, seed):
+    """Return Rounds (list) dealt, declared, and ready for trick taking."""
+    players = [make_player('kenny', i) for i in range(N_PLAYERS)]
+    names = ['kenny'] * N_PLAYERS
+    rounds = []
+    i = 0
+    while len(rounds) < nRounds:
+        r = setup(players, names, 'silent', seed=round_seed(seed, i))
+        i += 1
+        declarer = bidding(r, players)
+        declaring(r, players, declarer)
+        if not r.check_overbid():
+            rounds.append(r)
+    return rounds
+
+def time_operations(seed):
+    """Return the mean nanoseconds per call (dict) of engine operations."""
+    clock = time.perf_counter
+    times = {}
+
+    # legal_plays and next_turn, in positions from real trick taking: play
+    # each declared round out with the first legal card.
+    rounds = played_rounds(N_CALLS // N_CARDS_PLAYED + 1, seed)
+    legalTime = nextTime = 0.0
+    nCalls = 0
+    for r in rounds:
+        for _ in range(N_CARDS_PLAYED):
+            hand = r.h[r.whoseTurn]
+            t0 = clock()
+            legal = r.legal_plays(hand)
+            t1 = clock()
+            r.play_card(legal[0])
+            t2 = clock()
+            r.next_turn()
+            t3 = clock()
+            legalTime += t1 - t0
+            nextTime += t3 - t2
+            nCalls += 1
+    times['legal_plays'] = 1e9 * legalTime / nCalls
+    times['next_turn'] = 1e9 * nextTime / nCalls
+
+    # jack_multiplier and the sorting of hands, on random 12-card holdings
+    rng = random.Random(seed)
+    holdings = [rng.sample(CARDS, 12) for _ in range(N_CALLS)]
+    gameTypes = [rng.choice(GAMES[1:]) for _ in range(N_CALLS)]
+    t0 = clock()
+    for held, gameType in zip(holdings, gameTypes):
+        jack_multiplier(held, gameType)
+    times['jack_multiplier'] = 1e9 * (clock() - t0) / N_CALLS
+
+    hand = Round.Hand(0, 'bench')
+    t0 = clock()
+    for held, gameType in zip(holdings, gameTypes):
+        hand.reset()
+        hand.add(held)
+        hand.reorganize(gameType)
+        hand.cards
+    times['reorganize'] = 1e9 * (clock() - t0) / N_CALLS
+
+    cards = [hand.cards for _ in range(N_CALLS)]
+    t0 = clock()
+    for listOfLists in cards:
+        flatten(listOfLists)
+    times['flatten'] = 1e9 * (clock() - t0) / N_CALLS
+    return times
+
+def compare(results, baseline):
+    """Return a line per timing, with its ratio to the baseline (list)."""
+    lines = ['COMPARED TO BASELINE (ratio of times; * if {:g}x slower):'
+             .format(SLOWER)]
+    pairs = []
+    for name, player in results['players'].items():
+        old = baseline['players'].get(name)
+        if old is None:
+            continue
+        # As seconds per round, so that every ratio is one of times.
+        pairs.append(('{} round'.format(name), 1 / player['roundsPerSec'],
+                      1 / old['roundsPerSec'] if old['roundsPerSec']
+                      else None))
+        for phase, micros in player['phases'].items():
+            pairs.append(('{} {}'.format(name, phase), micros,
+                          old['phases'].get(phase)))
+    for operation, nanos in results['operations'].items():
+        pairs.append((operation, nanos,
+                      baseline['operations'].get(operation)))
+
+    for label, new, old in pairs:
+        if not old or not new:
+            continue
+        ratio = new / old
+        lines.append('{:<26} {:.2f}{}'.format(label, ratio,
+                                              ' *' if ratio > SLOWER else ''))
+    return lines
+
+def main():
+    args = parse_args()
+    results = {'rounds': args.rounds, 'seed': args.seed,
+               'python': platform.python_version(), 'players': {},
+               'operations': {}}
+
+    for name in args.players:
+        roundsPerSec, phases = time_rounds(name, args.rounds, args.seed)
+        results['players'][name] = {'roundsPerSec': roundsPerSec,
+                                    'phases': phases}
+        print('{}: {:.0f} rounds/s ({})'.format(
+            name, roundsPerSec,
+            ', '.join('{} {:.1f} us'.format(phase, micros)
+                      for phase, micros in phases.items())))
+
+    results['operations'] = time_operations(args.seed)
+    print(', '.join('{} {:.0f} ns'.format(operation, nanos)
+                    for operation, nanos in results['operations'].items()))
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            print('\n'.join(compare(results, json.load(f))))
+
+if __name__ == '__main__':
+    main()
@@ -32,7 +32,7 @@ def count_certain_tricks(suitContents, null=False):
     """Count how many tricks can be guaranteed won (or lost, for null)."""
     unsuitedContents = [card[0] for card in suitContents]
 
-    order = reversed(ORDER) # Sort suit with best cards first.
+    order = ORDER[-2::-1] # Sort suit with best cards first; jacks are trump.
     if null:
         order = NULL_ORDER
 
@@ -52,7 +52,6 @@ def count_certain_tricks(suitContents, null=False):
 
 ### OTHER
 
-def get_random(h, n=1):
-    """Return a list of n cards from the hand."""
-    flatHand = flatten(h.cards)
-    return random.sample(flatHand, n)
+def get_random(h, n=1, rng=random):
+    """Return a list of n cards from the hand, drawn with rng (e.g. r.rng)."""
+    return rng.sample(h.flat, n)
@@ -0,0 +1,448 @@
+"""Perfect-information (double-dummy) solver for the trick taking of a round.
+
+Given every player's hand, finds the result of the remaining tricks when all
+three players play perfectly: for a suit or grand game, the card points the
+declarer ends up with; for a null game, whether the declarer wins.
+
+The search is alpha-beta over the card masks of skat_classes: a binary search
+of null-window searches, with cheap move ordering, merging of equivalent cards
+(e.g. touching 7, 8, and 9 of a suit), and a transposition table of bounds and
+best moves keyed by the hands, the trick so far, and whose turn it is.
+
+Typical use from a bot:
+    solver = DoubleDummySolver(r.declaration[0], r.declarer)
+    points = solver.solve_round(r)
+
+Endgames solve in milliseconds, but a whole suit or grand game can take
+anywhere from a fraction of a second to most of a minute, so callers that
+can't wait should give solve() or move_values() a budget of nodes or a
+deadline; past it they raise BudgetExceeded, with bounds on the value.
+
+Run as a script, checks the solver against plain minimax on random endgames
+(see check()).
+"""
+
+import math
+import time
+from skat_classes import *
+
+# Per game type: strength of each card index against each card index led
+# (see TRICK_STRENGTHS), the mask of cards that follow each card led, and the
+# card indices of each Hand.cards slot from weakest to strongest.
+STRENGTHS = {gameType: tuple(tuple(TRICK_STRENGTHS[gameType][led][card]
+                                   for card in CARDS) for led in CARDS)
+             for gameType in GAMES}
+FOLLOW_MASKS = {gameType: tuple(SLOT_MASKS[gameType][CARD_SLOTS[gameType][i]]
+                                for i in range(len(CARDS)))
+                for gameType in GAMES}
+RANKINGS = {gameType: tuple((mask, order) for mask, order
+                            in zip(SLOT_MASKS[gameType], SLOT_ORDERS[gameType])
+                            if order)
+            for gameType in GAMES}
+CARD_POINTS = tuple(POINTS[card[0]] for card in CARDS)
+CHECK_NODES = 1024 # Nodes searched between checks of the deadline
+
+class BudgetExceeded(RuntimeError):
+    """A search ran out of nodes or time before it was solved.
+
+    low, high (int): Bounds on the value being solved, as far as the search
+      got (see DoubleDummySolver.solve()).
+    values (dict): For move_values(), the values of the cards solved before
+      the budget ran out (the bounds are then those of the next card).
+    """
+
+    def __init__(self, low, high, values=None):
+        super().__init__('Budget exceeded: value in [{}, {}]'.format(low,
+                                                                     high))
+        self.low = low
+        self.high = high
+        self.values = {} if values is None else values
+
+
+class _OutOfBudget(Exception):
+    """Unwinds a search in progress (see DoubleDummySolver._check_budget())."""
+
+
+class DoubleDummySolver:
+    """Solve trick-taking positions of one game type and declarer.
+
+    The transposition table is kept between calls, so reuse one solver for
+    positions from the same deal (e.g. to compare every legal play).
+
+    declarer (int): Seat of the declarer.
+    gameType (str): See skat_classes.
+    nodes (int): Positions searched so far, for curiosity and benchmarks.
+    table (dict): Bounds on the value of positions at the start of a trick.
+    """
+
+    def __init__(self, gameType, declarer):
+        if declarer is None:
+            raise ValueError('No declarer: nothing to solve in the minigame')
+        self.gameType = gameType
+        self.declarer = declarer
+        self.null = gameType == 'null'
+        self.strengths = STRENGTHS[gameType]
+        self.follow = FOLLOW_MASKS[gameType]
+        self.rankings = RANKINGS[gameType]
+        self.table = {}
+        self.nodes = 0
+        self.nodeLimit = self.nextCheck = math.inf
+        self.deadline = None
+
+    def solve(self, hands, seat, trick=(), maxNodes=None, deadline=None):
+        """Return the value (int) of a position under perfect play.
+
+        hands (list of int): Each seat's mask.
+        seat (int): Whose turn it is.
+        trick (sequence of str): Cards played so far this trick.
+        maxNodes (int): If given, the most positions to search.
+        deadline (float): If given, the time.monotonic() to give up at.
+
+        For a suit or grand game, the value is the card points the declarer
+        takes in the remaining tricks (including the current one); for a null
+        game, it is 1 if the declarer takes none of them and 0 otherwise.
+
+        Raises BudgetExceeded if maxNodes or deadline is reached first.  What
+        was solved so far stays in the table, so a later call picks up there.
+        """
+        hands = list(hands)
+        trick = [CARD_INDICES[card] for card in trick]
+        self._set_budget(maxNodes, deadline)
+        return self._exact(lambda alpha, beta:
+                           self._search(hands, seat, trick, alpha, beta),
+                           self._points_left(hands, trick))
+
+    def move_values(self, hands, seat, trick=(), maxNodes=None,
+                    deadline=None):
+        """Return the value (dict, see solve()) after each legal card.
+
+        maxNodes and deadline are as for solve(), for all the cards at once.
+        """
+        hands = list(hands)
+        trick = [CARD_INDICES[card] for card in trick]
+        self._set_budget(maxNodes, deadline)
+        pointsLeft = self._points_left(hands, trick)
+        values = {}
+        legal = self._legal(hands[seat], trick)
+        while legal:
+            low = legal & -legal
+            legal ^= low
+            card = low.bit_length() - 1
+            try:
+                values[CARDS[card]] = self._exact(
+                    lambda alpha, beta:
+                        self._play(hands, seat, trick, card, alpha, beta),
+                    pointsLeft)
+            except BudgetExceeded as e:
+                e.values = values
+                raise
+        return values
+
+    def solve_round(self, r):
+        """Return the solved result of a Round in progress.
+
+        For a suit or grand game, the declarer's final card points (int),
+        counting the tricks she has already taken and the kitty; for a null
+        game, whether the declarer wins (bool).
+        """
+        hands = [hand.mask for hand in r.h]
+        value = self.solve(hands, r.whoseTurn, r.currentTrick)
+        if self.null:
+            return r.cardsDeclarerMask == 0 and value == 1
+        return value + card_points(r.cardsDeclarerMask |
+                                   cards_to_mask(r.kitty))
+
+    def _exact(self, search, high):
+        """Return the exact value of search(alpha, beta), at most high.
+
+        A binary search of null-window searches, which cut off far more than
+        one wide search.  The table carries what was learned from one search
+        to the next.
+        """
+        low = 0
+        if self.null:
+            high = 1
+        try:
+            if self.null:
+                return search(0, 1)
+            while low < high:
+                beta = (low + high + 1) // 2
+                value = search(beta - 1, beta)
+                if value < beta:
+                    high = value
+                else:
+                    low = value
+            return low
+        except _OutOfBudget:
+            raise BudgetExceeded(low, high) from None
+
+    def _set_budget(self, maxNodes, deadline):
+        """Start counting a call's budget (see solve())."""
+        self.nodeLimit = math.inf if maxNodes is None \
+                         else self.nodes + maxNodes
+        self.deadline = deadline
+        self.nextCheck = self.nodeLimit if deadline is None \
+                         else min(self.nodeLimit, self.nodes + CHECK_NODES)
+
+    def _check_budget(self):
+        """Give up on the search if it is out of budget, else check later.
+
+        The positions being searched are copies (see solve()), and only
+        finished searches are stored in the table, so giving up anywhere
+        leaves the solver as good as it was.
+        """
+        if self.nodes >= self.nodeLimit or \
+           self.deadline is not None and time.monotonic() >= self.deadline:
+            raise _OutOfBudget
+        self.nextCheck = min(self.nodeLimit, self.nodes + CHECK_NODES)
+
+    def _points_left(self, hands, trick):
+        """Return the card points (int) not yet won by anyone."""
+        live = hands[0] | hands[1] | hands[2]
+        for card in trick:
+            live |= 1 << card
+        return card_points(live)
+
+    def _legal(self, hand, trick):
+        """Return the mask of cards that may be played."""
+        if trick:
+            return hand & self.follow[trick[0]] or hand
+        return hand
+
+    def _moves(self, hands, seat, trick):
+        """Return the distinct, sensibly ordered card indices to try.
+
+        Of two cards of the same suit (or trump) that nobody can play between,
+        only one needs searching.  In a suit or grand game they must also be
+        worth the same card points.
+        """
+        legal = self._legal(hands[seat], trick)
+        live = hands[0] | hands[1] | hands[2]
+        for card in trick:
+            live |= 1 << card
+
+        moves = []
+        for slotMask, ranking in self.rankings:
+            if not legal & slotMask:
+                continue
+            lastPoints = None # Points of the current run of equivalent cards
+            for card in ranking:
+                if legal >> card & 1:
+                    if lastPoints is None or (not self.null and
+                                              CARD_POINTS[card] != lastPoints):
+                        moves.append(card)
+                    lastPoints = CARD_POINTS[card]
+                elif live >> card & 1: # Someone else's card splits the run.
+                    lastPoints = None
+
+        if len(moves) > 1:
+            moves.sort(key=self._order_key(seat, trick))
+        return moves
+
+    def _order_key(self, seat, trick):
+        """Return a sort key that tries the likeliest best moves first."""
+        null = self.null
+        if not trick: # Lead high (or, for the null declarer, low).
+            strengths = self.strengths
+            if null and seat == self.declarer:
+                return lambda card: strengths[card][card]
+            return lambda card: -strengths[card][card]
+
+        strengths = self.strengths[trick[0]]
+        bestPosition, best = 0, strengths[trick[0]]
+        for i in range(1, len(trick)):
+            if strengths[trick[i]] > best:
+                bestPosition, best = i, strengths[trick[i]]
+        bestSeat = (seat - len(trick) + bestPosition) % N_PLAYERS
+        declarerWinning = bestSeat == self.declarer
+        if null: # Declarer ducks as high as possible; defenders let her win.
+            if seat == self.declarer:
+                return lambda card: (strengths[card] > best, -strengths[card])
+            return lambda card: strengths[card]
+        if declarerWinning == (seat == self.declarer): # Partner is winning.
+            return lambda card: (strengths[card] > best, -CARD_POINTS[card])
+        # Take the trick with as many points as possible, or else give up as
+        # few as possible.
+        return lambda card: (strengths[card] < best,
+                             -CARD_POINTS[card] if strengths[card] > best
+                             else CARD_POINTS[card])
+
+    def _play(self, hands, seat, trick, card, alpha, beta):
+        """Return the value of the position after seat plays card."""
+        bit = 1 << card
+        hands[seat] ^= bit
+        trick.append(card)
+        if len(trick) < N_PLAYERS:
+            value = self._search(hands, (seat + 1) % N_PLAYERS, trick,
+                                 alpha, beta)
+        else: # Award the trick and search on from its winner.
+            strengths = self.strengths[trick[0]]
+            a, b, c = strengths[trick[0]], strengths[trick[1]], \
+                      strengths[trick[2]]
+            winner = (seat + (1 if a > b and a > c else 2 if b > c else 3)) \
+                     % N_PLAYERS
+            if self.null:
+                if winner == self.declarer:
+                    value = 0 # Declarer took a trick: lost.
+                else:
+                    value = self._search(hands, winner, [], alpha, beta)
+            elif winner == self.declarer:
+                points = CARD_POINTS[trick[0]] + CARD_POINTS[trick[1]] + \
+                         CARD_POINTS[trick[2]]
+                value = points + self._search(hands, winner, [],
+                                              alpha - points, beta - points)
+            else:
+                value = self._search(hands, winner, [], alpha, beta)
+        trick.pop()
+        hands[seat] ^= bit
+        return value
+
+    def _search(self, hands, seat, trick, alpha, beta):
+        """Return the alpha-beta value of a position (see solve())."""
+        self.nodes += 1
+        if self.nodes >= self.nextCheck:
+            self._check_budget()
+        if not trick and not hands[seat]: # Out of cards
+            return 1 if self.null else 0
+
+        key = hands[0] | hands[1] << 32 | hands[2] << 64 | seat << 96
+        for i, card in enumerate(trick):
+            key |= card + 1 << 98 + 6 * i
+        entry = self.table.get(key)
+        if entry is None: # All that's known: the points left to take
+            if self.null:
+                low, high, hashMove = 0, 1, None
+            else:
+                low, high, hashMove = 0, self._points_left(hands, trick), None
+        else:
+            low, high, hashMove = entry
+        if low >= beta or low == high:
+            return low
+        if high <= alpha:
+            return high
+        alpha, beta = max(alpha, low), min(beta, high)
+        originalAlpha, originalBeta = alpha, beta
+
+        moves = self._moves(hands, seat, trick)
+        if hashMove is not None and hashMove in moves: # Best move last time
+            moves.remove(hashMove)
+            moves.insert(0, hashMove)
+
+        maximizing = seat == self.declarer
+        best = -1 if maximizing else TOTAL_POINTS + 1
+        for card in moves:
+            value = self._play(hands, seat, trick, card, alpha, beta)
+            if maximizing:
+                if value > best:
+                    best, bestMove = value, card
+                    alpha = max(alpha, value)
+            else:
+                if value < best:
+                    best, bestMove = value, card
+                    beta = min(beta, value)
+            if alpha >= beta:
+                break
+
+        if best <= originalAlpha:
+            high = min(high, best)
+        elif best >= originalBeta:
+            low = max(low, best)
+        else:
+            low = high = best
+        self.table[key] = (low, high, bestMove)
+        return best
+
+
+def minimax(gameType, declarer, hands, seat, trick):
+    """Return the value of a position (see solve()) by plain minimax.
+
+    Arguments are as for DoubleDummySolver.solve(), but trick holds card
+    indices (see CARDS).  Exponential, so only for checking the solver on
+    endgames.
+    """
+    if not trick and not hands[seat]: # Out of cards
+        return 1 if gameType == 'null' else 0
+    legal = hands[seat]
+    if trick:
+        legal = legal & FOLLOW_MASKS[gameType][trick[0]] or legal
+    values = []
+    for card in mask_to_cards(legal):
+        index = CARD_INDICES[card]
+        nextHands = list(hands)
+        nextHands[seat] ^= 1 << index
+        nextTrick = trick + [index]
+        if len(nextTrick) < N_PLAYERS:
+            values.append(minimax(gameType, declarer, nextHands,
+                                  (seat + 1) % N_PLAYERS, nextTrick))
+            continue
+        winner = (seat + 1 + trick_winner([CARDS[i] for i in nextTrick],
+                                          gameType)) % N_PLAYERS
+        if gameType == 'null':
+            values.append(0 if winner == declarer else
+                          minimax(gameType, declarer, nextHands, winner, []))
+        else:
+            points = sum(CARD_POINTS[i] for i in nextTrick) \
+                     if winner == declarer else 0
+            values.append(points + minimax(gameType, declarer, nextHands,
+                                           winner, []))
+    return max(values) if seat == declarer else min(values)
+
+def check(nPositions, seed=0, maxCards=4):
+    """Check the solver against minimax() on random endgames.
+
+    Deals up to maxCards (int) cards to each seat, plays part of a trick at
+    random, and compares solve() and the best of move_values() with
+    minimax().  Returns the mismatches found (list of str).
+    """
+    rng = random.Random(seed)
+    mismatches = []
+    for _ in range(nPositions):
+        gameType = rng.choice(GAMES)
+        declarer, seat = rng.randrange(N_PLAYERS), rng.randrange(N_PLAYERS)
+        nCards = rng.randint(1, maxCards)
+        deck = list(CARDS)
+        rng.shuffle(deck)
+        hands = [cards_to_mask(deck[i * nCards:(i + 1) * nCards])
+                 for i in range(N_PLAYERS)]
+        trick = []
+        for _ in range(rng.randrange(N_PLAYERS)):
+            legal = hands[seat]
+            if trick:
+                legal = legal & FOLLOW_MASKS[gameType][trick[0]] or legal
+            card = CARD_INDICES[rng.choice(mask_to_cards(legal))]
+            hands[seat] ^= 1 << card
+            trick.append(card)
+            seat = (seat + 1) % N_PLAYERS
+
+        expected = minimax(gameType, declarer, hands, seat, trick)
+        solver = DoubleDummySolver(gameType, declarer)
+        cards = [CARDS[card] for card in trick]
+        solved = solver.solve(hands, seat, cards)
+        best = (max if seat == declarer else min)(
+            solver.move_values(hands, seat, cards).values())
+        if solved != expected or best != expected:
+            mismatches.append('{} declarer {}, hands {}, seat {}, trick {}: '
+                              'minimax {}, solve {}, move_values {}'.format(
+                              gameType, declarer,
+                              [mask_to_cards(hand) for hand in hands], seat,
+                              cards, expected, solved, best))
+    return mismatches
+
+def main():
+    import argparse # Only needed here
+    parser = argparse.ArgumentParser(
+        description='Check the solver against plain minimax on endgames.')
+    parser.add_argument('--positions', type=int, default=600, metavar='N',
+                        help='random endgames to check (default 600)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    mismatches = check(args.positions, args.seed)
+    for mismatch in mismatches:
+        print(mismatch)
+    print('{} of {} positions solved as by minimax'.format(
+        args.positions - len(mismatches), args.positions))
+    if mismatches:
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,261 @@
+"""Compact binary records of played rounds, with replay and bulk loading.
+
+A record file is a short header (MAGIC) followed by fixed-size records, one
+per round, appended as rounds are played.  Each record (RECORD_SIZE bytes,
+little-endian) holds, in order:
+  deck: The deal, all 32 cards in dealing order (see Round.deck).
+  bids: The bidding history, one code per bid (see BIDS).
+  plays: The play history.
+  discards: The kitty at the end of the round (what the declarer discarded,
+    or the untouched kitty if there was no pickup).
+  nBids, nPlays (int): How many bids and plays are filled in.
+  declarer (int): The declarer's seat (NO_DECLARER in the minigame).
+  gameType (int): Index in GAMES.
+  extras (int): Declaration bitset (see skat_classes.declaration_bits()),
+    including the extras earned during scoring.
+  scores (3 x int16): Each seat's score.
+Cards are card indices (see CARDS) and bids are codes, both packed 5 bits
+apiece, lowest bits first.
+
+Records are random access, so RecordReader memory-maps the file: it can
+replay any one record into a Round (see replay()), or load any number of them
+into NumPy arrays at once (see RecordReader.arrays()) for offline analysis.
+NumPy is only imported for the latter.
+
+Typical use:
+    with RecordWriter('games.skat') as writer:
+        scores = play_one_round(players, names, verbosity, r)
+        writer.write(r, scores)
+"""
+
+import mmap
+import os
+import struct
+from collections import namedtuple
+from skat_classes import *
+from play_skat import play_one_round
+
+MAGIC       = b'SKATREC1'
+MAX_BIDS    = 48 # Way more than any sensible bidding takes
+N_PLAYS     = 30 # Excluding kitty
+NO_DECLARER = 3
+BIDS        = (False, True) + LEGAL_BIDS # Index = 5-bit code of a bid
+
+_BID_CODES = {bid: code for code, bid in enumerate(BIDS)}
+# Bytes of each packed field
+_PACKED_SIZES = {'deck': (5 * len(CARDS) + 7) // 8,
+                 'bids': (5 * MAX_BIDS + 7) // 8,
+                 'plays': (5 * N_PLAYS + 7) // 8,
+                 'discards': (5 * 2 + 7) // 8}
+_FIELDS = struct.Struct('<{deck}s{bids}s{plays}s{discards}sBBBBB3h'
+                        .format(**_PACKED_SIZES))
+RECORD_SIZE = _FIELDS.size
+
+# A round as decoded from a record.  Cards are str, bids as in Round, and
+# declaration is the final one, as in Round.declaration.
+GameRecord = namedtuple('GameRecord', ('deck', 'bids', 'declarer',
+                                       'declaration', 'discards', 'plays',
+                                       'scores'))
+
+def pack5(codes, size):
+    """Return 5-bit codes (sequence of int < 32) packed into size bytes."""
+    packed = 0
+    for i, code in enumerate(codes):
+        packed |= code << 5 * i
+    return packed.to_bytes(size, 'little')
+
+def unpack5(data, n):
+    """Return the first n 5-bit codes (list of int) packed in data."""
+    packed = int.from_bytes(data, 'little')
+    return [packed >> 5 * i & 31 for i in range(n)]
+
+def pack_round(r, scores):
+    """Return the record (bytes) of a finished Round and its scores."""
+    if len(r.bidHistory) > MAX_BIDS:
+        raise ValueError('Too many bids to record: {}'
+                         .format(len(r.bidHistory)))
+    try:
+        bids = [_BID_CODES[bid] for bid in r.bidHistory]
+    except KeyError as e:
+        raise ValueError('Not a legal bid: {}'.format(e.args[0]))
+
+    declarer = NO_DECLARER if r.declarer is None else r.declarer
+    return _FIELDS.pack(
+        pack5([CARD_INDICES[card] for card in r.deck], _PACKED_SIZES['deck']),
+        pack5(bids, _PACKED_SIZES['bids']),
+        pack5([CARD_INDICES[card] for card in r.playHistory],
+              _PACKED_SIZES['plays']),
+        pack5([CARD_INDICES[card] for card in r.kitty],
+              _PACKED_SIZES['discards']),
+        len(bids), len(r.playHistory), declarer,
+        GAMES.index(r.declaration[0]), declaration_bits(r.declaration),
+        *scores)
+
+def unpack_round(data):
+    """Return the GameRecord of a record (bytes-like)."""
+    deck, bids, plays, discards, nBids, nPlays, declarer, gameType, \
+        extras, *scores = _FIELDS.unpack(data)
+    declaration = [GAMES[gameType]] + [item for item, bit
+                                       in DECLARATION_BITS.items()
+                                       if extras & bit]
+    return GameRecord(deck=[CARDS[i] for i in unpack5(deck, len(CARDS))],
+                      bids=[BIDS[code] for code in unpack5(bids, nBids)],
+                      declarer=None if declarer == NO_DECLARER else declarer,
+                      declaration=declaration,
+                      discards=[CARDS[i] for i in unpack5(discards, 2)],
+                      plays=[CARDS[i] for i in unpack5(plays, nPlays)],
+                      scores=scores)
+
+
+class ReplayPlayer:
+    """A player that makes the moves of a recorded round.
+
+    Every seat can share one ReplayPlayer, since each move is looked up by
+    how far the Round has got rather than by who is asked.
+    """
+
+    def __init__(self, record):
+        self.record = record
+
+    def reset(self, seat):
+        pass
+
+    def assess_hand(self, r):
+        pass
+
+    def bid(self, _, r):
+        return self.record.bids[len(r.bidHistory)]
+
+    def kitty(self, _, __):
+        return 'no kitty' not in self.record.declaration
+
+    def discard(self, _, __):
+        return list(self.record.discards)
+
+    def declare(self, _, __):
+        return [item for item in self.record.declaration
+                if item == self.record.declaration[0] or item in EXTRAS]
+
+    def play(self, _, r):
+        return self.record.plays[len(r.playHistory)]
+
+def replay(record, r=None, names=('A', 'B', 'C'), verbosity='silent'):
+    """Play a GameRecord again, e.g. into a verbose Round to watch it.
+
+    Returns the scores (list of int), which match the recorded ones.  r (obj)
+    is as for play_one_round(); afterward it holds the round's final state.
+    """
+    players = [ReplayPlayer(record)] * N_PLAYERS
+    return play_one_round(players, list(names), verbosity, r, record.deck)
+
+
+class RecordWriter:
+    """Append records of rounds to a file.
+
+    file (obj): The file, opened for appending in binary mode.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'ab')
+        if self.file.tell() == 0:
+            self.file.write(MAGIC)
+
+    def write(self, r, scores):
+        """Append the record of a finished Round and its scores."""
+        self.file.write(pack_round(r, scores))
+
+    def write_records(self, data):
+        """Append already packed records (bytes, e.g. from pack_round())."""
+        self.file.write(data)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+class RecordReader:
+    """Random access to the records of a file, through a memory map.
+
+    data (obj): The memory-mapped file.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < len(MAGIC):
+                raise ValueError('Not a skat record file: {}'.format(path))
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError('Not a skat record file: {}'.format(path))
+
+    def __len__(self):
+        return (len(self.data) - len(MAGIC)) // RECORD_SIZE
+
+    def __getitem__(self, i):
+        """Return the GameRecord of record i (int)."""
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('record index out of range')
+        start = len(MAGIC) + i * RECORD_SIZE
+        return unpack_round(self.data[start:start + RECORD_SIZE])
+
+    def replay(self, i, r=None, names=('A', 'B', 'C'), verbosity='silent'):
+        """Replay record i; see replay()."""
+        return replay(self[i], r, names, verbosity)
+
+    def arrays(self, start=0, stop=None):
+        """Return records start to stop - 1 as NumPy arrays (dict).
+
+        Keys are the field names of the module docstring, each an array with
+        one row per record: deck (n, 32), bids (n, MAX_BIDS), plays (n, 30),
+        and discards (n, 2) of codes, padded with zeros past nBids and
+        nPlays; scores (n, 3); and the rest (n,).
+        """
+        import numpy as np
+
+        stop = len(self) if stop is None else min(stop, len(self))
+        n = max(0, stop - start)
+        dtype = np.dtype([(name, 'u1', size)
+                          for name, size in _PACKED_SIZES.items()] +
+                         [('nBids', 'u1'), ('nPlays', 'u1'),
+                          ('declarer', 'u1'), ('gameType', 'u1'),
+                          ('extras', 'u1'), ('scores', '<i2', 3)])
+        records = np.frombuffer(self.data, dtype, n,
+                                len(MAGIC) + start * RECORD_SIZE)
+
+        arrays = {name: records[name].copy()
+                  for name in ('nBids', 'nPlays', 'declarer', 'gameType',
+                               'extras', 'scores')}
+        for name, width in (('deck', len(CARDS)), ('bids', MAX_BIDS),
+                            ('plays', N_PLAYS), ('discards', 2)):
+            arrays[name] = _unpack5_array(np, records[name], width)
+        return arrays
+
+    def close(self):
+        self.data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+def _unpack5_array(np, packed, width, chunk=1 << 16):
+    """Return 5-bit codes (n x width array) from packed rows of bytes.
+
+    Works through chunk rows at a time to bound the memory of the bits.
+    """
+    weights = np.array([1, 2, 4, 8, 16], dtype=np.uint8)
+    codes = np.empty((len(packed), width), dtype=np.uint8)
+    for start in range(0, len(packed), chunk):
+        bits = np.unpackbits(packed[start:start + chunk], axis=1,
+                             bitorder='little')[:, :5 * width]
+        codes[start:start + chunk] = \
+            (bits.reshape(-1, width, 5) * weights).sum(axis=2)
+    return codes
@@ -0,0 +1,211 @@
+"""Opt-in timing of players' decisions and counting of engine operations.
+
+Nothing here is used unless asked for (see skat_wrapper --instrument), so an
+ordinary run pays nothing for it.  Instead of the usual players and Round:
+  TimedPlayer: Wraps a player and records how long each of its methods takes
+    per call, in a LatencyHistogram per method.
+  CountingRound: A Round that counts calls of its engine operations (see
+    COUNTED_OPS), e.g. legal_plays() and next_turn().
+Instruments gathers both for a run, can be merged across worker processes,
+and reports per-player latency percentiles and operations per round.
+
+ProfileStats carries a cProfile profile from a worker process back to the
+parent, where pstats can merge it with the others (see skat_wrapper
+--profile).
+"""
+
+import math
+import time
+from collections import Counter
+from skat_classes import N_PLAYERS, Round
+
+PLAYER_METHODS = ('assess_hand', 'bid', 'kitty', 'discard', 'declare', 'play')
+COUNTED_OPS = ('deal', 'get_bid', 'get_kitty_declaration',
+               'get_kitty_discards', 'get_declaration', 'get_play',
+               'legal_plays', 'legal_mask', 'next_turn', 'make_move',
+               'unmake_move', 'check_overbid', 'score', 'score_minigame')
+BUCKETS_PER_OCTAVE = 8 # Latencies are reported to within about 9%.
+MIN_LATENCY = 1e-7 # Seconds; anything faster shares the lowest bucket.
+
+class LatencyHistogram:
+    """Count latencies in logarithmically spaced buckets.
+
+    Buckets keep memory constant however many calls are timed, and
+    histograms from separate processes can be merged.
+
+    buckets (Counter): How many latencies fell in each bucket (int index).
+    n (int): How many latencies have been added.
+    total (float): Their sum, in seconds.
+    max (float): The longest, in seconds.
+    """
+
+    def __init__(self):
+        self.buckets = Counter()
+        self.n = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        """Count one latency (float, seconds)."""
+        if seconds > MIN_LATENCY:
+            bucket = int(math.log2(seconds / MIN_LATENCY) *
+                         BUCKETS_PER_OCTAVE)
+        else:
+            bucket = 0
+        self.buckets[bucket] += 1
+        self.n += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other):
+        """Fold another LatencyHistogram into this one."""
+        self.buckets.update(other.buckets)
+        self.n += other.n
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q):
+        """Return the latency (float, seconds) below which a fraction q fall.
+
+        Accurate to a bucket: returns the upper edge of the bucket holding
+        the quantile, but never more than max.
+        """
+        if self.n == 0:
+            return float('nan')
+        rank = q * self.n
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                break
+        return min(self.max,
+                   MIN_LATENCY * 2 ** ((bucket + 1) / BUCKETS_PER_OCTAVE))
+
+
+class TimedPlayer:
+    """Time every call of a player's methods (see PLAYER_METHODS).
+
+    Anything else is passed through to the player untouched, so a
+    TimedPlayer can stand in for the player it wraps.
+
+    player (obj): The wrapped player.
+    latencies (dict): A LatencyHistogram per method name.
+    """
+
+    def __init__(self, player, latencies):
+        self.player = player
+        self.latencies = latencies
+        for method in PLAYER_METHODS:
+            setattr(self, method, self.timed(method))
+
+    def timed(self, method):
+        """Return a function that calls and times one of player's methods."""
+        call = getattr(self.player, method)
+        histogram = self.latencies.setdefault(method, LatencyHistogram())
+        clock = time.perf_counter
+        def timed_call(*args):
+            start = clock()
+            result = call(*args)
+            histogram.add(clock() - start)
+            return result
+        return timed_call
+
+    def reset(self, seat):
+        self.player.reset(seat)
+
+    def __getattr__(self, name):
+        return getattr(self.player, name)
+
+
+class CountingRound(Round):
+    """A Round that counts calls of its engine operations.
+
+    opCounts (Counter): Calls so far of each of COUNTED_OPS.  Every round
+      deals once, so opCounts['deal'] is also the number of rounds.
+    """
+
+    def __init__(self, names, verbosity, sink=None, opCounts=None):
+        self.opCounts = Counter() if opCounts is None else opCounts
+        super().__init__(names, verbosity, sink)
+
+def _counted(name):
+    """Return a CountingRound method that counts calls of Round's name."""
+    method = getattr(Round, name)
+    def counted(self, *args):
+        self.opCounts[name] += 1
+        return method(self, *args)
+    counted.__name__ = name
+    counted.__doc__ = method.__doc__
+    return counted
+
+for _name in COUNTED_OPS:
+    setattr(CountingRound, _name, _counted(_name))
+
+
+class Instruments:
+    """The latencies and operation counts of a run.
+
+    latencies (list of dicts): Per player (in the order named on the command
+      line, whatever seat they sit in), a LatencyHistogram per method.
+    opCounts (Counter): Engine operations, as in CountingRound.
+    """
+
+    def __init__(self):
+        self.latencies = [{} for _ in range(N_PLAYERS)]
+        self.opCounts = Counter()
+
+    def wrap_players(self, players):
+        """Return TimedPlayers (list) wrapping each of players."""
+        return [TimedPlayer(p, latencies)
+                for p, latencies in zip(players, self.latencies)]
+
+    def make_round(self, names, verbosity):
+        """Return a CountingRound that counts into opCounts."""
+        return CountingRound(names, verbosity, opCounts=self.opCounts)
+
+    def merge(self, other):
+        """Fold another Instruments (e.g. from a worker) into this one."""
+        for mine, theirs in zip(self.latencies, other.latencies):
+            for method, histogram in theirs.items():
+                mine.setdefault(method, LatencyHistogram()).merge(histogram)
+        self.opCounts.update(other.opCounts)
+
+    def report(self, names):
+        """Return lines (list of str) of latencies and operations per round.
+
+        names (list of str): Player names, as for latencies.
+        """
+        lines = ['DECISION LATENCY (us; p50, p99, max; calls):']
+        for name, latencies in zip(names, self.latencies):
+            for method in PLAYER_METHODS:
+                histogram = latencies.get(method)
+                if histogram is None or histogram.n == 0:
+                    continue
+                lines.append('{} {:<11} {:9.1f} {:9.1f} {:9.1f}; {}'.format(
+                    name, method, 1e6 * histogram.quantile(0.5),
+                    1e6 * histogram.quantile(0.99), 1e6 * histogram.max,
+                    histogram.n))
+
+        nRounds = self.opCounts['deal']
+        lines.append('ENGINE OPERATIONS PER ROUND ({} rounds):'
+                     .format(nRounds))
+        for op in COUNTED_OPS:
+            if self.opCounts[op]:
+                lines.append('{:<21} {:.2f}'.format(
+                    op, self.opCounts[op] / max(nRounds, 1)))
+        return lines
+
+
+class ProfileStats:
+    """A picklable profile, in the form pstats.Stats.add() accepts.
+
+    stats (dict): The profile's raw statistics (see cProfile.Profile).
+    """
+
+    def __init__(self, profile):
+        profile.create_stats()
+        self.stats = profile.stats
+
+    def create_stats(self):
+        pass # Already created; pstats calls this before reading stats.
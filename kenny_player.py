@@ -16,10 +16,14 @@ class KennyPlayer:
     def __init__(self, seat):
         self.seat = seat
 
+    def reset(self, seat):
+        """Get ready for a new round, to be played from the given seat."""
+        self.seat = seat
+
     def assess_hand(self, r):
         """Flip coins to determine how high to bid."""
         bidIndex = -1
-        while bool(random.getrandbits(1)): # Coin flip
+        while bool(r.rng.getrandbits(1)): # Coin flip
             bidIndex += 1
         if bidIndex == -1:
             self.maxBid = LEGAL_BIDS[0] - 1 # Pass immediately.
@@ -32,13 +36,13 @@ class KennyPlayer:
     def kitty(self, _, __):
         return True # Always take the kitty.
 
-    def discard(self, h, _):
-        return get_random(h, 2)
+    def discard(self, h, r):
+        return get_random(h, 2, r.rng)
  
     def declare(self, _, r):
         if r.currentBid > 23: # Forbid an illegal overbid null game.
-            return [random.choice([g for g in GAMES if g != 'null'])]
-        return [random.choice(GAMES)]
+            return [r.rng.choice([g for g in GAMES if g != 'null'])]
+        return [r.rng.choice(GAMES)]
 
     def play(self, h, r):
-        return random.choice(r.legal_plays(h))
+        return r.rng.choice(r.legal_plays(h))
@@ -0,0 +1,305 @@
+"""A Monte Carlo skat player.
+
+Monty guesses.  Before every card he plays, he deals the cards he can't see at
+random among the other hands (and the kitty, unless he knows it), keeping only
+deals consistent with what he has seen: the cards already played, and the
+suits each player has shown to be void in by failing to follow suit.  For each
+such deal he scores every legal play, either by solving the rest of the round
+double dummy (see double_dummy) once few enough tricks are left, or by playing
+it out at random before that.  He then plays the card with the best average.
+
+The deals are spread over a pool of processes, and he stops sampling when his
+time per move runs out, so he plays better on more cores but no slower.  Under
+a time control (see Round.set_time_control()) he also keeps within what the
+engine allows, sharing a round clock out evenly over his remaining cards.
+
+In the bidding he is simple: he bids on a grand with three jacks and two
+aces, or on his longest suit if he has six trumps in it.
+
+See play_skat and the Round class in skat_classes for context.
+"""
+
+import atexit
+import os
+import time
+from skat_classes import *
+from bot_utils import *
+from double_dummy import (DoubleDummySolver, CARD_POINTS, FOLLOW_MASKS,
+                          STRENGTHS)
+
+N_SAMPLES     = 64  # Most deals to sample per move
+TIME_PER_MOVE = 1.0 # Seconds
+SOLVE_TRICKS  = 5   # Solve exactly when this many tricks (or fewer) are left
+BATCH_SIZE    = 4   # Deals per job sent to the pool
+HAND_SIZE     = 10  # Cards in each hand when the trick taking starts
+TIME_SHARE    = 0.8 # Of the engine's time limit, the most to spend sampling
+ACE_MASK      = cards_to_mask(['a' + suit for suit in SUITS])
+
+def random_playout(gameType, declarer, hands, seat, trick, rng,
+                   firstCard=None):
+    """Play out a position at random and return its value.
+
+    Arguments and value are as for DoubleDummySolver.solve(), except that
+    trick holds card indices (see CARDS).  If given, firstCard (int) is
+    played first instead of a random card.
+    """
+    hands, trick = list(hands), list(trick)
+    follow, strengths = FOLLOW_MASKS[gameType], STRENGTHS[gameType]
+    value = 0
+    while hands[seat]:
+        if firstCard is None:
+            hand = hands[seat]
+            legal = hand & follow[trick[0]] or hand if trick else hand
+            card = CARD_INDICES[rng.choice(mask_to_cards(legal))]
+        else:
+            card, firstCard = firstCard, None
+        hands[seat] ^= 1 << card
+        trick.append(card)
+        if len(trick) < N_PLAYERS:
+            seat = (seat + 1) % N_PLAYERS
+            continue
+
+        ledStrengths = strengths[trick[0]]
+        best = max(range(N_PLAYERS), key=lambda i: ledStrengths[trick[i]])
+        seat = (seat + 1 + best) % N_PLAYERS # Winner leads next.
+        if seat == declarer:
+            if gameType == 'null':
+                return 0 # Declarer took a trick: lost.
+            value += CARD_POINTS[trick[0]] + CARD_POINTS[trick[1]] + \
+                     CARD_POINTS[trick[2]]
+        trick = []
+    return 1 if gameType == 'null' else value
+
+def evaluate_deals(job):
+    """Return the summed value (dict) of each legal play over some deals.
+
+    Runs in a worker process, so job is a tuple of plain data: game type,
+    declarer, seat to play, current trick (list of str), deals (list of
+    hand masks), and a seed for the random playouts.
+    """
+    gameType, declarer, seat, trick, deals, seed = job
+    rng = random.Random(seed)
+    trickIndices = [CARD_INDICES[card] for card in trick]
+    totals = {}
+    for hands in deals:
+        if bin(hands[seat]).count('1') <= SOLVE_TRICKS:
+            solver = DoubleDummySolver(gameType, declarer)
+            values = solver.move_values(hands, seat, trick)
+        else:
+            hand = hands[seat]
+            legal = hand & FOLLOW_MASKS[gameType][trickIndices[0]] or hand \
+                    if trick else hand
+            values = {card: random_playout(gameType, declarer, hands, seat,
+                                           trickIndices, rng,
+                                           CARD_INDICES[card])
+                      for card in mask_to_cards(legal)}
+        for card, value in values.items():
+            totals[card] = totals.get(card, 0) + value
+    return totals
+
+def replay_history(r):
+    """Return what the play history shows about each seat (tuple of lists).
+
+    The first list holds the slot masks each seat has shown it lacks: a
+    player who didn't follow the card led must be out of that suit (or
+    trump).  The second holds how many cards each seat has played.
+    """
+    gameType = r.declaration[0]
+    voids, played = [0, 0, 0], [0, 0, 0]
+    leader = 0 # Player 0 leads the first trick.
+    history = r.playHistory
+    for start in range(0, len(history), N_PLAYERS):
+        trick = history[start:start + N_PLAYERS]
+        ledMask = FOLLOW_MASKS[gameType][CARD_INDICES[trick[0]]]
+        for i, card in enumerate(trick):
+            played[(leader + i) % N_PLAYERS] += 1
+            if not CARD_BITS[card] & ledMask:
+                voids[(leader + i) % N_PLAYERS] |= ledMask
+        if len(trick) == N_PLAYERS:
+            leader = (leader + trick_winner(trick, gameType)) % N_PLAYERS
+    return voids, played
+
+def sample_deal(r, seat, voids, played, rng, maxTries=1000):
+    """Return a random deal (list of hand masks) consistent with the history.
+
+    voids, played (list of int): See replay_history().
+
+    Uniform over the consistent deals: a card that only one place (hand or
+    kitty) can hold goes there, as it does in every consistent deal, then
+    the rest are shuffled and dealt out by the room each place has, and a
+    deal that gives a seat a card it is void in is rejected.  Returns None
+    if no consistent deal turned up in maxTries attempts.
+    """
+    unseen = r.cardsLeftMask & ~r.h[seat].mask
+    for card in r.currentTrick:
+        unseen &= ~CARD_BITS[card]
+    if seat == r.declarer and 'no kitty' not in r.declaration:
+        unseen &= ~cards_to_mask(r.kitty) # She discarded the kitty herself.
+
+    others = [s for s in range(N_PLAYERS) if s != seat]
+    room = [HAND_SIZE - played[s] for s in range(N_PLAYERS)]
+    room[seat] = 0
+    kittyRoom = bin(unseen).count('1') - sum(room)
+    hands = [0, 0, 0]
+    hands[seat] = r.h[seat].mask
+    free = []
+    for card in mask_to_cards(unseen):
+        bit = CARD_BITS[card]
+        holders = [s for s in others if not voids[s] & bit]
+        if len(holders) + (kittyRoom > 0) > 1:
+            free.append(card)
+        elif holders:
+            hands[holders[0]] |= bit
+            room[holders[0]] -= 1
+        elif kittyRoom:
+            kittyRoom -= 1
+        else:
+            return None # Nowhere for it to be.
+    if min(room) < 0:
+        return None
+
+    for _ in range(maxTries):
+        rng.shuffle(free)
+        deal = list(hands)
+        start = 0
+        for s in others:
+            dealt = cards_to_mask(free[start:start + room[s]])
+            if dealt & voids[s]:
+                break # Breaks a void; start over.
+            deal[s] |= dealt
+            start += room[s]
+        else:
+            return deal # The rest are the kitty.
+    return None
+
+
+class MontyPlayer:
+    def __init__(self, seat, workers=None, timePerMove=TIME_PER_MOVE,
+                 nSamples=N_SAMPLES):
+        self.seat = seat
+        self.workers = workers or os.cpu_count() or 1
+        self.timePerMove = timePerMove
+        self.nSamples = nSamples
+        self.pool = None # Started on first use, shut down by close()
+
+    def reset(self, seat):
+        """Get ready for a new round, to be played from the given seat."""
+        self.seat = seat
+
+    def assess_hand(self, r):
+        """Pick the game to bid on and how high to go."""
+        mask = r.h[self.seat].mask
+        self.game = None
+        self.maxBid = LEGAL_BIDS[0] - 1 # Pass immediately.
+
+        jacks = bin(mask & JACK_MASK).count('1')
+        aces = bin(mask & ACE_MASK).count('1')
+        longest = max(GAMES[1:-1],
+                      key=lambda g: bin(mask & TRUMP_MASKS[g]).count('1'))
+        if jacks >= 3 and aces >= 2:
+            self.game = 'grand'
+        elif bin(mask & TRUMP_MASKS[longest]).count('1') >= 6:
+            self.game = longest
+        if self.game is not None:
+            self.maxBid = game_value_bits(
+                self.game, 0, False, jack_multiplier_mask(mask, self.game))
+
+    def bid(self, _, r):
+        return bid_incrementally(r, self.maxBid)
+
+    def kitty(self, _, __):
+        return True # Always take the kitty.
+
+    def discard(self, h, _):
+        """Discard the two weakest cards that aren't trump."""
+        game = self.game or 'grand'
+        sideCards = h.mask & ~TRUMP_MASKS[game]
+        if bin(sideCards).count('1') < 2:
+            sideCards = h.mask
+        strengths = TRICK_STRENGTHS[game]
+        return sorted(mask_to_cards(sideCards),
+                      key=lambda card: (strengths[card][card],
+                                        POINTS[card[0]]))[:2]
+
+    def declare(self, _, r):
+        if self.game is None: # Won the bidding by others' passing.
+            self.game = 'grand'
+        return [self.game]
+
+    def play(self, h, r):
+        legalPlays = r.legal_plays(h)
+        if len(legalPlays) == 1 or r.declarer is None: # Minigame: no solver
+            return r.rng.choice(legalPlays)
+
+        deadline = time.monotonic() + self.time_for_move(h, r)
+        totals = self.sample_values(r, deadline)
+        if not totals:
+            return r.rng.choice(legalPlays)
+        pick = max if self.seat == r.declarer else min
+        return pick(legalPlays, key=lambda card: totals.get(card, 0))
+
+    def time_for_move(self, h, r):
+        """Return the seconds (float) to spend choosing a card."""
+        allowed = r.time_remaining()
+        clock = r.clocks[self.seat]
+        if clock is not None:
+            allowed = min(allowed, clock / len(h.flat))
+        return min(self.timePerMove, TIME_SHARE * allowed)
+
+    def sample_values(self, r, deadline):
+        """Return the summed value (dict) of each play over sampled deals."""
+        voids, played = replay_history(r)
+        deals = []
+        for _ in range(self.nSamples):
+            hands = sample_deal(r, self.seat, voids, played, r.rng)
+            if hands is not None:
+                deals.append(tuple(hands))
+        batches = [deals[i:i + BATCH_SIZE]
+                   for i in range(0, len(deals), BATCH_SIZE)]
+        jobs = [(r.declaration[0], r.declarer, self.seat,
+                 list(r.currentTrick), batch, r.rng.getrandbits(32))
+                for batch in batches]
+
+        totals = {}
+        def add(result):
+            for card, value in result.items():
+                totals[card] = totals.get(card, 0) + value
+
+        pool = self.get_pool()
+        if pool is None: # Evaluate in this process until time is up.
+            for job in jobs:
+                if time.monotonic() > deadline:
+                    break
+                add(evaluate_deals(job))
+            return totals
+
+        from concurrent.futures import wait, FIRST_COMPLETED
+        pending = {pool.submit(evaluate_deals, job) for job in jobs}
+        while pending:
+            done, pending = wait(pending, deadline - time.monotonic(),
+                                 FIRST_COMPLETED)
+            if not done: # Out of time: use what has come back.
+                for future in pending:
+                    future.cancel()
+                break
+            for future in done:
+                add(future.result())
+        return totals
+
+    def get_pool(self):
+        """Return the process pool, or None to evaluate in this process."""
+        import multiprocessing # Only needed here; slow to import
+        from concurrent.futures import ProcessPoolExecutor
+        if self.workers == 1 or multiprocessing.current_process().daemon:
+            return None # Daemonic processes (e.g. --workers) can't fork.
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(self.workers)
+            atexit.register(self.close)
+        return self.pool
+
+    def close(self):
+        """Shut down the process pool, if started (it restarts if needed)."""
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+            atexit.unregister(self.close)
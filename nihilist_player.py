@@ -13,6 +13,10 @@ class NihilistPlayer:
     def __init__(self, seat):
         self.seat = seat
 
+    def reset(self, seat):
+        """Get ready for a new round, to be played from the given seat."""
+        self.seat = seat
+
     def assess_hand(self, r):
         """Assess null hand strength to determine how high to bid."""
         self.hand = r.h[self.seat]
@@ -23,8 +27,6 @@ class NihilistPlayer:
         safeTricks = 0
         for suit in self.hand.cards[:-1]: # Skip empty trump suit.
             safeTricks += count_certain_tricks(suit, True)
-        print(safeTricks)
-        self.hand.show(r.zazz[1])
 
         if safeTricks < 8:
             self.maxBid = 0
@@ -41,11 +43,11 @@ class NihilistPlayer:
     def kitty(self, _, __):
         return True # Always take the kitty.
 
-    def discard(self, h, _):
-        return get_random(h, 2)
+    def discard(self, h, r):
+        return get_random(h, 2, r.rng)
  
     def declare(self, _, r):
         return ['null']
 
     def play(self, h, r):
-        return random.choice(r.legal_plays(h))
+        return r.rng.choice(r.legal_plays(h))
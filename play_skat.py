@@ -3,65 +3,149 @@
 Intended to be imported into a wrapper (skat_wrapper) so that more than one
 round can be played.  Low-level details, along with thorough documentation, are
 in another module (skat_classes).
+
+Player objects are meant to be constructed once and reused for many rounds.
+At the start of each round, every player's reset(seat) is called, followed by
+its assess_hand(r), so expensive setup belongs in the constructor.
+
+Players should draw any random numbers from the Round's generator (r.rng)
+rather than the random module, so that a seeded round is reproducible.
 """
 
 from skat_classes import *
 
 N_CARDS = 30 # Excluding kitty
 
-def trick_taking(r, players):
-    for _ in range(N_CARDS):
-        r.get_play(players[r.whoseTurn])
-        r.next_turn()
+def play_one_round(players, names, verbosity, r=None, deck=None, seed=None):
+    """Play and return the scores (list of int) for one round.
 
-def play_one_round(players, names, verbosity):
-    """Play and return the scores (list of int) for one round."""
-    # Setup
-    r = Round(names, verbosity) # Instantiation of a single round of skat
-    r.generate_deck()
-    [p.assess_hand(r) for p in players] # List, not generator --> non-lazy
-    scores = [0, 0, 0] # Convention: p0 plays first, p1 bids first, p2 deals
-    
-    # Bidding
+    r (obj): Optionally, a Round to reset and reuse instead of instantiating
+      a new one, to save allocations when playing many rounds.
+    deck (list of str): Optionally, the deal to play (in dealing order, see
+      Round.deck) instead of a random one, e.g. to replay a recorded round.
+    seed (int): Optionally, a seed for the round's random number generator
+      (Round.rng), to make the round reproducible.
+
+    The phases of a round are separate functions, called in turn here, so
+    that they can also be driven (or timed, see benchmark) one by one.
+    """
+    r = setup(players, names, verbosity, r, deck, seed)
+    return run(round_steps(r, players))
+
+def run(steps):
+    """Take a round through steps (a generator, see round_steps()).
+
+    Each step's Round method is called, and its result sent back.  Returns
+    what steps returns.
+    """
+    result = None
+    try:
+        while True:
+            method, args = steps.send(result)
+            result = method(*args)
+    except StopIteration as finished:
+        return finished.value
+
+# The rules of a round are written once, as generators that yield each step
+# that needs a player's decision: the Round method that asks for and makes it
+# (e.g. r.get_bid) and a tuple of its arguments.  Whatever drives them sends
+# back the method's result, so the same rules can be driven directly (run())
+# or, with an async_skat.AsyncRound, by awaiting the players.
+
+def round_steps(r, players):
+    """Yield the steps of a dealt round; return its scores (list of int)."""
+    declarer = yield from bidding_steps(r, players)
+    yield from declaring_steps(r, players, declarer)
+
+    overbid = r.check_overbid()
+    if overbid:
+        scores = [0, 0, 0]
+        scores[declarer] = -2 * overbid
+        return scores
+
+    yield from trick_taking_steps(r, players)
+    return scoring(r)
+
+def bidding_steps(r, players):
+    """Yield the steps of the bidding; return the declarer (see bidding())."""
     while True: # Repeat until a player passes.
-        if not r.get_bid(players[1], 1):
+        if not (yield r.get_bid, (players[1], 1)):
             advancer = 0
             break
-        if not r.get_bid(players[0], 0):
+        if not (yield r.get_bid, (players[0], 0)):
             advancer = 1
             break
     
     while True:
-        if not r.get_bid(players[2], 2):
+        if not (yield r.get_bid, (players[2], 2)):
             declarer = advancer
             break
-        if not r.get_bid(players[advancer], advancer):
+        if not (yield r.get_bid, (players[advancer], advancer)):
             declarer = 2
             break
 
     if r.bidHistory == [False, False]: # First players both passed.
-        if not r.get_bid(players[0], 0):
-            r.declarer    = None
-            r.declaration = ['grand']
-            r.check_overbid()
-            trick_taking(r, players)
-            return r.score_minigame()
-        else:
-            declarer = 0
-    
-    # Declaring (first kitty, then game type and other extras)
-    if r.get_kitty_declaration(players[declarer], declarer):
+        if not (yield r.get_bid, (players[0], 0)):
+            return None
+        declarer = 0
+    return declarer
+
+def declaring_steps(r, players, declarer):
+    """Yield the steps of declaring (see declaring())."""
+    if declarer is None:
+        r.declare_minigame()
+        return
+
+    if (yield r.get_kitty_declaration, (players[declarer], declarer)):
         r.give_kitty()
-        r.get_kitty_discards(players[declarer])
-    r.get_declaration(players[declarer])
-    
-    overbid = r.check_overbid()
-    if overbid:
-        scores[declarer] = -2 * overbid
-        return scores
-    
-    trick_taking(r, players)
-    
-    # Scoring
-    scores[declarer] = r.score()
+        yield r.get_kitty_discards, (players[declarer],)
+    yield r.get_declaration, (players[declarer],)
+
+def trick_taking_steps(r, players):
+    """Yield the steps of the trick taking."""
+    for _ in range(N_CARDS):
+        yield r.get_play, (players[r.whoseTurn],)
+        r.next_turn()
+
+def setup(players, names, verbosity, r=None, deck=None, seed=None):
+    """Deal a round, let the players see their hands, and return the Round.
+
+    Arguments are as for play_one_round().
+    """
+    if r is None:
+        r = Round(names, verbosity) # Instantiation of a single round of skat
+    deal(r, names, verbosity, deck, seed)
+    for i, p in enumerate(players):
+        p.reset(i)
+        p.assess_hand(r)
+    return r
+
+def deal(r, names, verbosity, deck=None, seed=None):
+    """Reset a Round and deal it (arguments as for play_one_round())."""
+    r.reset(names, verbosity, seed)
+    if deck is None:
+        r.generate_deck()
+    else:
+        r.deal(deck)
+
+def bidding(r, players):
+    """Hold the bidding and return the declarer (int; None if all pass)."""
+    return run(bidding_steps(r, players))
+
+def declaring(r, players, declarer):
+    """Settle the kitty, then game type and other extras.
+
+    If nobody bid (declarer is None), sets up the minigame instead.
+    """
+    run(declaring_steps(r, players, declarer))
+
+def trick_taking(r, players):
+    run(trick_taking_steps(r, players))
+
+def scoring(r):
+    """Return the scores (list of int) of a finished round."""
+    if r.declarer is None:
+        return r.score_minigame()
+    scores = [0, 0, 0] # Convention: p0 plays first, p1 bids first, p2 deals
+    scores[r.declarer] = r.score()
     return scores
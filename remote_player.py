@@ -0,0 +1,379 @@
+#!/usr/bin/env python
+"""Players that run in another process, spoken to in lines of JSON.
+
+The engine sends a bot process one request per line on its stdin, and the
+bot answers each with one line on its stdout:
+    {"id": 7, "game": 2, "method": "play", "seat": 0, "state": {...}}
+    {"id": 7, "result": "jc"}
+or, if the bot failed, {"id": 7, "error": "..."}.
+
+method is one of the calls a player gets (see play_skat and Round): reset,
+assess_hand, bid, kitty, discard, declare, or play; results are as the player
+methods return them, with null for reset and assess_hand.  state is what the
+seat may know of the round (see encode_state()).  Each game id stands for one
+player object on the bot's side, lasting from its first reset on, so a bot
+process can play in any number of rounds at once.  Answers may come back in
+any order; the engine matches them to requests by id.
+
+RemotePlayer is the engine's side: a player like any other, except that it
+forwards each call to a BotProcess.  Many RemotePlayers (in different seats,
+or in rounds played concurrently by threads) can share one BotProcess, so a
+heavy bot starts once and its round trips overlap.  Calls whose answers
+aren't needed right away (reset, assess_hand) are sent without waiting.
+AsyncRemotePlayer does the same for rounds played concurrently by asyncio
+(see async_skat).
+
+serve() is the bot's side: it reads whatever requests have arrived, answers
+them all, and writes the answers back in one go, so a busy bot pays for its
+I/O per batch rather than per request.  It can serve any player class,
+rebuilding a Round from each request's state, so that e.g.
+    ./skat_wrapper.py "remote:./remote_player.py kenny" bob nihilist 6 scores
+plays a Kenny in a subprocess.
+"""
+
+import atexit
+import itertools
+import json
+import math
+import os
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from skat_classes import *
+
+READ_SIZE = 1 << 16 # Bytes per read of a pipe
+CLOSE_TIME = 5 # Seconds a bot gets to exit once its input is closed
+
+class RemotePlayerError(RuntimeError):
+    """A bot process failed to answer a request."""
+
+
+def encode_state(r, seat):
+    """Return what seat may know of a Round (dict of JSON-able data).
+
+    hand, kitty (list of str): The seat's cards, and the kitty if the seat
+      has seen it (as the declarer who picked it up).
+    gameType (str): How the hand is organized (see Hand.gameType).
+    bids, plays, trick (list): r.bidHistory, r.playHistory, r.currentTrick.
+    currentBid, declarer, declaration, whoseTurn, leader: As in Round.
+    timeRemaining (float): See Round.time_remaining() (None if unlimited).
+    clocks (list of float): As in Round.
+    seed (int): A seed for the bot's random number generator, drawn from
+      r.rng, so that a seeded round stays reproducible.
+    """
+    hand = r.h[seat]
+    seenKitty = seat == r.declarer and 'no kitty' not in r.declaration
+    timeRemaining = r.time_remaining()
+    return {'hand': list(hand.flat), 'gameType': hand.gameType,
+            'kitty': list(r.kitty) if seenKitty else [],
+            'bids': r.bidHistory, 'plays': r.playHistory,
+            'trick': r.currentTrick, 'currentBid': r.currentBid,
+            'declarer': r.declarer, 'declaration': r.declaration,
+            'whoseTurn': r.whoseTurn, 'leader': r.leader,
+            'timeRemaining': None if timeRemaining == math.inf
+                             else timeRemaining,
+            'clocks': r.clocks, 'seed': r.rng.getrandbits(32)}
+
+def decode_state(state, seat, r):
+    """Set up a Round (reset in place) from encode_state()'s data.
+
+    Only the seat's own hand is filled in, so r.zobrist keys what the seat
+    knows: its hand, the trick, the leader, and the game type.
+    """
+    r.reset(seed=state['seed'])
+    hand = r.h[seat]
+    hand.add(state['hand'])
+    hand.reorganize(state['gameType'])
+    r.kitty = state['kitty']
+    r.bidHistory[:] = state['bids']
+    r.playHistory[:] = state['plays']
+    r.currentTrick = list(state['trick'])
+    r.currentBid = state['currentBid']
+    r.declarer = state['declarer']
+    r.declaration[:] = state['declaration']
+    r.whoseTurn = state['whoseTurn']
+    r.leader = state['leader']
+    r.cardsLeftMask = FULL_DECK & ~cards_to_mask(state['plays'])
+    r.deadline = None if state['timeRemaining'] is None \
+                 else time.monotonic() + state['timeRemaining']
+    r.clocks[:] = state['clocks']
+    r.rebuild_state_key()
+
+
+class BotProcess:
+    """A bot process, shared by any number of RemotePlayers.
+
+    process (obj): The subprocess.Popen.
+    pending (dict): Futures of the requests not yet answered, by id.
+    failure (str): Why the bot will answer no more requests (None while it
+      still may).
+    """
+
+    def __init__(self, command):
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE)
+        self.pending = {}
+        self.ids = itertools.count()
+        self.lock = threading.Lock() # Guards pending, failure, and stdin.
+        self.failure = None # Why the bot can't answer any more (str)
+        reader = threading.Thread(target=self.read_answers, daemon=True)
+        reader.start()
+
+    def request(self, game, method, seat, state=None):
+        """Send a request; return a Future of its result."""
+        return self.request_many([(game, method, seat, state)])[0]
+
+    def request_many(self, requests):
+        """Send requests (tuples of request()'s arguments) in one write.
+
+        Returns a Future (list) per request.
+        """
+        futures = []
+        lines = []
+        with self.lock:
+            if self.failure is not None:
+                raise RemotePlayerError(self.failure)
+            for game, method, seat, state in requests:
+                i = next(self.ids)
+                future = self.pending[i] = Future()
+                futures.append(future)
+                lines.append(json.dumps({'id': i, 'game': game,
+                                         'method': method, 'seat': seat,
+                                         'state': state}))
+            self.process.stdin.write(('\n'.join(lines) + '\n').encode())
+            self.process.stdin.flush()
+        return futures
+
+    def read_answers(self):
+        """Resolve the Futures of answers as they arrive (in a thread).
+
+        Lines that answer no pending request (e.g. a bot's own logging on
+        stdout) are skipped, with a warning on stderr.  Once the bot exits,
+        or this thread fails, every pending request fails.
+        """
+        try:
+            for line in self.process.stdout:
+                if not line.strip():
+                    continue
+                try:
+                    answer = json.loads(line)
+                    with self.lock:
+                        future = self.pending.pop(answer['id'])
+                except (ValueError, TypeError, KeyError):
+                    print('Skipping bot output: {}'.format(
+                          line.decode(errors='replace').rstrip()),
+                          file=sys.stderr)
+                    continue
+                if not future.set_running_or_notify_cancel():
+                    continue # Nobody wants it any more.
+                if 'error' in answer:
+                    future.set_exception(RemotePlayerError(answer['error']))
+                else:
+                    future.set_result(answer.get('result'))
+            self.fail('Bot process exited')
+        except BaseException as e:
+            self.fail('Lost the bot process: {}: {}'.format(
+                      type(e).__name__, e))
+            raise
+
+    def fail(self, failure):
+        """Fail every pending request, and any made later, with failure."""
+        with self.lock:
+            if self.failure is None:
+                self.failure = failure
+            pending, self.pending = self.pending, {}
+        for future in pending.values():
+            if future.set_running_or_notify_cancel():
+                future.set_exception(RemotePlayerError(self.failure))
+
+    def close(self):
+        """Let the bot finish (by closing its stdin); return its exit status.
+
+        A bot still running CLOSE_TIME seconds later is killed.
+        """
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass # It has gone already.
+        try:
+            return self.process.wait(CLOSE_TIME)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            return self.process.wait()
+
+_bots = {} # Shared BotProcesses, by command
+
+def connect(command):
+    """Return the BotProcess running command (str), started if need be.
+
+    Every BotProcess started here is closed at exit (see close_bots()).
+    """
+    if not _bots:
+        atexit.register(close_bots)
+    if command not in _bots:
+        _bots[command] = BotProcess(shlex.split(command))
+    return _bots[command]
+
+def close_bots():
+    """Close every BotProcess started by connect(), warning of failures."""
+    atexit.unregister(close_bots)
+    while _bots:
+        command, bot = _bots.popitem()
+        status = bot.close()
+        if status:
+            print('Bot process {!r} exited with status {}'.format(command,
+                                                                  status),
+                  file=sys.stderr)
+
+
+class RemotePlayer:
+    """Forward each call to a player in a bot process.
+
+    bot (obj): The BotProcess.
+    game (int): This player's id in the bot's requests.
+    unanswered (list): Futures of calls sent without waiting, checked for
+      errors at the next call that waits.
+    """
+
+    games = itertools.count() # Game ids, unique per engine process
+
+    def __init__(self, bot, seat):
+        self.bot = bot
+        self.seat = seat
+        self.game = next(self.games)
+        self.unanswered = []
+
+    def reset(self, seat):
+        self.seat = seat
+        self.unanswered.append(self.bot.request(self.game, 'reset', seat))
+
+    def assess_hand(self, r):
+        self.unanswered.append(self.bot.request(
+            self.game, 'assess_hand', self.seat, encode_state(r, self.seat)))
+
+    def call(self, method, r):
+        """Return the result of a player method, once the bot answers.
+
+        Under a time control, waits no longer than the time left (see
+        Round.time_remaining()), raising FutureTimeoutError.
+        """
+        timeLimit = r.time_remaining()
+        deadline = time.monotonic() + timeLimit
+        future = self.bot.request(self.game, method, self.seat,
+                                  encode_state(r, self.seat))
+        unanswered, self.unanswered = self.unanswered, []
+        try:
+            for earlier in unanswered + [future]:
+                timeout = None if timeLimit == math.inf \
+                          else max(0.0, deadline - time.monotonic())
+                result = earlier.result(timeout) # Raises if the bot failed.
+        except FutureTimeoutError:
+            future.cancel() # Its answer, if it comes, is skipped.
+            raise
+        return result
+
+    def bid(self, _, r):
+        return self.call('bid', r)
+
+    def kitty(self, _, r):
+        return self.call('kitty', r)
+
+    def discard(self, _, r):
+        return self.call('discard', r)
+
+    def declare(self, _, r):
+        return self.call('declare', r)
+
+    def play(self, _, r):
+        return self.call('play', r)
+
+
+class AsyncRemotePlayer(RemotePlayer):
+    """A RemotePlayer whose calls are coroutines (see async_skat).
+
+    While one awaits the bot's answer, the event loop gets on with other
+    rounds, whose requests then reach the bot in the same batches.
+    """
+
+    async def call(self, method, r):
+        """Return the result of a player method, once the bot answers."""
+        import asyncio # Only needed here
+        future = self.bot.request(self.game, method, self.seat,
+                                  encode_state(r, self.seat))
+        unanswered, self.unanswered = self.unanswered, []
+        for earlier in unanswered:
+            await asyncio.wrap_future(earlier) # Raises if the bot failed.
+        return await asyncio.wrap_future(future)
+
+
+def answer(request, players, rounds, make_player):
+    """Return the answer (dict) to one request, made by a local player."""
+    game, method, seat = request['game'], request['method'], request['seat']
+    try:
+        if method == 'reset':
+            if game not in players:
+                players[game] = make_player(seat)
+                rounds[game] = Round(['?'] * N_PLAYERS, 'silent')
+            players[game].reset(seat)
+            return {'id': request['id'], 'result': None}
+
+        player, r = players[game], rounds[game]
+        decode_state(request['state'], seat, r)
+        if method == 'assess_hand':
+            result = player.assess_hand(r)
+        elif method == 'kitty':
+            result = player.kitty(r.h[seat].cards, r)
+        else:
+            result = getattr(player, method)(r.h[seat], r)
+        return {'id': request['id'], 'result': result}
+    except Exception as e: # Reported to the engine instead
+        return {'id': request['id'],
+                'error': '{}: {}'.format(type(e).__name__, e)}
+
+def serve(make_player, infile=None, outfile=None, latency=0):
+    """Answer requests with local players until the input ends.
+
+    make_player (function): Returns a new player for a seat (int).
+    infile, outfile (obj): Binary files (default stdin and stdout).
+    latency (float): Seconds to wait before answering each batch, to stand
+      in for a slow or faraway bot when testing drivers (see async_skat).
+    """
+    fdIn = (infile or sys.stdin.buffer).fileno()
+    outfile = outfile or sys.stdout.buffer
+    players, rounds = {}, {}
+    buffer = b''
+    while True:
+        chunk = os.read(fdIn, READ_SIZE) # Whatever has arrived
+        if not chunk:
+            break
+        *lines, buffer = (buffer + chunk).split(b'\n')
+        answers = [json.dumps(answer(json.loads(line), players, rounds,
+                                     make_player))
+                   for line in lines if line.strip()]
+        if not answers:
+            continue
+        if latency:
+            time.sleep(latency)
+        try:
+            outfile.write(('\n'.join(answers) + '\n').encode())
+            outfile.flush()
+        except BrokenPipeError:
+            return # The engine has stopped listening.
+
+def main():
+    import argparse # Only needed here
+    # Not needed by the engine's side
+    from skat_wrapper import make_player, PLAYER_NAMES
+    parser = argparse.ArgumentParser(
+        description='Serve a bundled player over stdin and stdout.')
+    parser.add_argument('player', choices=PLAYER_NAMES)
+    parser.add_argument('--latency', type=float, default=0, metavar='S',
+                        help='wait S seconds before answering each batch')
+    args = parser.parse_args()
+    serve(lambda seat: make_player(args.player, seat), latency=args.latency)
+
+if __name__ == '__main__':
+    main()
@@ -12,6 +12,10 @@ class SilentBobPlayer:
     def __init__(self, seat):
         self.seat = seat
 
+    def reset(self, seat):
+        """Get ready for a new round, to be played from the given seat."""
+        self.seat = seat
+
     def assess_hand(self, r):
         pass
 
@@ -28,4 +32,4 @@ class SilentBobPlayer:
         pass                 #
 
     def play(self, h, r):
-        return random.choice(r.legal_plays(h))
+        return r.rng.choice(r.legal_plays(h))
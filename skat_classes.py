@@ -17,10 +17,18 @@ Common attributes/arguments:
     affect the game value multiplier (see EXTRAS, UNCALLABLE_EXTRAS).
   gameType (str): Game chosen by declarer ('null', a suit, or 'grand' -- see
     GAMES).  Always the first item in a declaration.
+  mask (int): A set of cards packed into the low 32 bits of an int, one bit
+    per card (see CARDS).  Hands and piles are stored this way internally; the
+    lists of str above are views built from masks on demand.
   names (list of str): How to identify the players in printed output.
 """
 
+import copy
+import math
 import random
+import threading
+import time
+from skat_events import EventSink, make_sink
 
 SUITS        = 'dshc'
 ORDER        = '789qktaj'
@@ -36,6 +44,40 @@ EXTRAS       = ('reveals', 'calls three quarters', 'calls everything!')
 UNCALLABLE_EXTRAS = ('takes three quarters', 'loses three quarters',
                      'takes everything!', 'loses everything!')
 
+# Card i of the mask representation.  Suits occupy consecutive bytes, and
+# within a suit bits follow ORDER, so that e.g. 'jc' is the highest bit.
+CARDS        = tuple(value + suit for suit in SUITS for value in ORDER)
+CARD_INDICES = {card: i for i, card in enumerate(CARDS)}
+CARD_BITS    = {card: 1 << i for i, card in enumerate(CARDS)}
+FULL_DECK    = (1 << len(CARDS)) - 1
+SUIT_MASKS   = tuple(0xff << 8 * i for i in range(len(SUITS)))
+JACK_MASK    = sum(CARD_BITS['j' + suit] for suit in SUITS)
+
+def cards_to_mask(cards):
+    """Return the mask (int) of a list of cards."""
+    mask = 0
+    for card in cards:
+        mask |= CARD_BITS[card]
+    return mask
+
+def mask_to_cards(mask):
+    """Return the cards (list of str) in a mask, lowest bit first."""
+    cards = []
+    while mask:
+        low = mask & -mask
+        cards.append(CARDS[low.bit_length() - 1])
+        mask ^= low
+    return cards
+
+# Card points of every possible single-suit byte; see card_points().
+_BYTE_POINTS = tuple(sum(POINTS[ORDER[i]] for i in range(8) if byte >> i & 1)
+                     for byte in range(256))
+
+def card_points(mask):
+    """Return the total card points (int) of the cards in a mask."""
+    return (_BYTE_POINTS[mask & 0xff] + _BYTE_POINTS[mask >> 8 & 0xff] +
+            _BYTE_POINTS[mask >> 16 & 0xff] + _BYTE_POINTS[mask >> 24])
+
 def all_trumps(gameType):
     """Return the entire trump suit (list of str) for the given gameType."""
     allTrumps = [] # For a null game, this will be returned unmodified.
@@ -45,26 +87,176 @@ def all_trumps(gameType):
         allTrumps += ['j' + suit for suit in SUITS]
     return allTrumps
 
+def _hand_layout(gameType):
+    """Return the five slot masks and display orders used by Hand.cards."""
+    if gameType is None: # Unorganized: everything sits in the trump slot.
+        return (0, 0, 0, 0, FULL_DECK), ((), (), (), (), tuple(range(32)))
+
+    trumps = tuple(CARD_INDICES[card] for card in all_trumps(gameType))
+    trumpMask = sum(1 << i for i in trumps)
+    masks = tuple(m & ~trumpMask for m in SUIT_MASKS) + (trumpMask,)
+
+    order = NULL_ORDER if gameType == 'null' else ORDER
+    orders = tuple(tuple(sorted((i for i in range(32) if m >> i & 1),
+                                key=lambda i: order.find(CARDS[i][0])))
+                   for m in masks[:-1])
+    return masks, orders + (trumps,)
+
+def jack_bits(mask):
+    """Return the jacks in a mask as a 4-bit int (bit i for SUITS[i])."""
+    return mask >> 7 & 1 | mask >> 14 & 2 | mask >> 21 & 4 | mask >> 28 & 8
+
+def trump_key(mask, gameType):
+    """Return the trumps in a mask as an 11-bit int.
+
+    The high 4 bits are the jacks (see jack_bits()) and, in a suit game, the
+    low 7 bits are the other trumps, following ORDER.  In a null game, 0.
+    """
+    if gameType == 'null':
+        return 0
+    key = jack_bits(mask) << 7
+    if gameType != 'grand':
+        key |= mask >> 8 * SUITS.find(gameType[0]) & 0x7f
+    return key
+
+def _slot_views(gameType):
+    """Return lookup tables mapping mask bytes to the slots of Hand.cards."""
+    orders = SLOT_ORDERS[gameType]
+    suitViews = tuple(tuple(tuple(CARDS[i] for i in orders[slot]
+                                  if byte >> i - 8 * slot & 1)
+                            for byte in range(256))
+                      for slot in range(len(SUITS)))
+    trumpShift, trumpViews, jackViews = 0, ((),) * 128, ((),) * 16
+    if gameType != 'null':
+        jackViews = tuple(tuple('j' + SUITS[i] for i in range(len(SUITS))
+                                if bits >> i & 1)
+                          for bits in range(16))
+    if gameType != 'null' and gameType != 'grand': # Non-jack trumps
+        trumpShift = 8 * SUITS.find(gameType[0])
+        trumpViews = tuple(tuple(CARDS[trumpShift + i] for i in range(7)
+                                 if byte >> i & 1)
+                           for byte in range(128))
+    return suitViews, trumpShift, trumpViews, jackViews
+
+# Per game type (None meaning not yet organized): the mask of each of the five
+# Hand.cards slots, the order cards are listed in within each slot, and the
+# slot (int) each card index belongs to.  SLOT_VIEWS turns each byte of a mask
+# directly into the contents of a suit slot, and the trump suit's byte and
+# jack_bits() into the contents of the trump slot.
+SLOT_MASKS, SLOT_ORDERS, CARD_SLOTS, SLOT_VIEWS = {}, {}, {}, {}
+for _gameType in (None,) + GAMES:
+    SLOT_MASKS[_gameType], SLOT_ORDERS[_gameType] = _hand_layout(_gameType)
+    CARD_SLOTS[_gameType] = tuple(
+        [slot for slot, m in enumerate(SLOT_MASKS[_gameType]) if m >> i & 1][0]
+        for i in range(32))
+    if _gameType is not None:
+        SLOT_VIEWS[_gameType] = _slot_views(_gameType)
+TRUMP_MASKS = {gameType: SLOT_MASKS[gameType][-1] for gameType in GAMES}
+
+def _trick_strengths(gameType):
+    """Return the card strengths (dict) against each possible card led."""
+    allTrumps = all_trumps(gameType)
+    order = NULL_ORDER if gameType == 'null' else ORDER
+    slots = CARD_SLOTS[gameType]
+
+    strengths = {}
+    for led in CARDS:
+        strengths[led] = {}
+        for card in CARDS:
+            if card in allTrumps: # Trumps beat everything else.
+                strength = len(order) + allTrumps.index(card)
+            elif slots[CARD_INDICES[card]] == slots[CARD_INDICES[led]]:
+                strength = order.index(card[0])
+            else: # Neither followed suit nor trumped
+                strength = -1
+            strengths[led][card] = strength
+    return strengths
+
+# Per game type and card led, the strength of each card in the trick.
+TRICK_STRENGTHS = {gameType: _trick_strengths(gameType) for gameType in GAMES}
+
+def trick_winner(trick, gameType):
+    """Return the position (int) in the trick of the card that takes it."""
+    strengths = TRICK_STRENGTHS[gameType][trick[0]]
+    winner = 0
+    for i in range(1, len(trick)):
+        if strengths[trick[i]] > strengths[trick[winner]]:
+            winner = i
+    return winner
+
+def _streak(key, nBits):
+    """Return the length of the run of equal bits at the top of a key."""
+    top = key >> nBits - 1 & 1
+    for i in range(nBits):
+        if key >> nBits - 1 - i & 1 != top: # Breaks the streak
+            return i
+    return nBits # Has (or is missing!) a complete set of trump
+
+# Jack multiplier of every possible trump_key() (see jack_multiplier_mask()).
+# In a suit game the key's bits, from the top, follow the trumps from 'jc'
+# down to the 7; in a grand only the four jack bits count.
+_SUIT_MULTIPLIERS = tuple(_streak(key, 11) for key in range(1 << 11))
+JACK_MULTIPLIERS = {gameType: _SUIT_MULTIPLIERS for gameType in BASE_VALUES}
+JACK_MULTIPLIERS['grand'] = tuple(_streak(key >> 7, 4)
+                                  for key in range(1 << 11))
+
+def jack_multiplier_mask(mask, gameType):
+    """Return the jack multiplier (0 < int < 12) of the trumps in a mask.
+
+    The fast equivalent of jack_multiplier(), for bots that assess many
+    games: mask may also include non-trump cards, which are ignored.
+    """
+    if gameType == 'null':
+        return None
+    return JACK_MULTIPLIERS[gameType][trump_key(mask, gameType)]
+
 def jack_multiplier(heldTrumps, gameType):
     """Return the jack multiplier (0 < int < 12), for calculating game value.
     
     heldTrumps (list of str): Combined trump in kitty and declarer's hand.
     """
     assert gameType in GAMES
-    if gameType == 'null':
-        return None
+    return jack_multiplier_mask(cards_to_mask(heldTrumps), gameType)
+
+# Bit of each declaration item in a declaration bitset (see game_value_bits()).
+DECLARATION_BITS = {item: 1 << i for i, item in
+                    enumerate(('no kitty',) + EXTRAS + UNCALLABLE_EXTRAS)}
+NULL_VALUES = {0: 23, DECLARATION_BITS['reveals']: 46,
+               DECLARATION_BITS['no kitty']: 35,
+               DECLARATION_BITS['no kitty'] | DECLARATION_BITS['reveals']: 59}
+
+def _extra_multiplier(bits, roundOver):
+    """Return how much a declaration bitset adds to the game multiplier."""
+    mult = bin(bits).count('1')
+    if not roundOver: # Assume declarer will hit her targets.
+        if bits & DECLARATION_BITS['calls three quarters']:
+            mult += 1 # Anticipating 'take three quarters'
+        if bits & DECLARATION_BITS['calls everything!']:
+            mult += 1 # Anticipating 'take everything'
+    return mult
 
-    allTrumps = all_trumps(gameType)
-    hasHighTrump = 'jc' in heldTrumps
+# Multiplier added by every possible declaration bitset, indexed by roundOver.
+EXTRA_MULTIPLIERS = tuple(tuple(_extra_multiplier(bits, roundOver)
+                                for bits in range(1 << len(DECLARATION_BITS)))
+                          for roundOver in (False, True))
 
-    for i in range(2, len(allTrumps) + 1): # Backward from top
-        hasThisTrump = allTrumps[-i] in heldTrumps
-        if hasThisTrump != hasHighTrump: # Breaks the streak
-            break
-    else:
-        i += 1 # Has (or is missing!) a complete set of trump
+def declaration_bits(declaration):
+    """Return the declaration bitset (int) of a declaration's extras."""
+    bits = 0
+    for item in declaration[1:]:
+        bits |= DECLARATION_BITS.get(item, 0)
+    return bits
+
+def game_value_bits(gameType, bits, roundOver, jackMultiplier=None):
+    """Return the game value (int) of a game type and declaration bitset.
 
-    return i - 1
+    The fast equivalent of game_value(), for bots that assess many games.
+    """
+    if gameType == 'null':
+        return NULL_VALUES[bits & (DECLARATION_BITS['no kitty'] |
+                                   DECLARATION_BITS['reveals'])]
+    return BASE_VALUES[gameType] * \
+           (1 + jackMultiplier + EXTRA_MULTIPLIERS[roundOver][bits])
 
 def game_value(declaration, roundOver, jackMultiplier=None):
     """Return the game value (int), typically a base value times a multiplier.
@@ -72,33 +264,28 @@ def game_value(declaration, roundOver, jackMultiplier=None):
     roundOver (bool): Whether trick taking has concluded.
     jackMultiplier (0 < int < 12): See jack_multiplier().
     """
-    if declaration[0] == 'null':
-        if 'no kitty' in declaration and 'reveals' in declaration:
-            return 59
-        if 'no kitty' in declaration:
-            return 35
-        if 'reveals' in declaration:
-            return 46
-        return 23
-
-    mult = 1 + jackMultiplier
-
-    for item in ('no kitty',) + EXTRAS + UNCALLABLE_EXTRAS:
-        if item in declaration:
-            mult += 1
-
-    if not roundOver: # Assume declarer will hit her targets.
-        if 'calls three quarters' in declaration:
-            mult += 1 # Anticipating 'take three quarters'
-        if 'calls everything!' in declaration:
-            mult += 1 # Anticipating 'take everything'
-
-    return BASE_VALUES[declaration[0]] * mult
+    return game_value_bits(declaration[0], declaration_bits(declaration),
+                           bool(roundOver), jackMultiplier)
+
+# Zobrist keys: a random 64-bit int per feature of the trick-taking state.  A
+# state's key is the XOR of the keys of its features, so it can be updated
+# with one XOR per change (see Hand.key, Round.stateKey, and Round.zobrist).
+# Drawn from a private, fixed-seed generator so that keys are the same in
+# every process and the global random module is left untouched.
+_zobristRandom = random.Random(0x5ca7)
+ZOBRIST_HANDS  = tuple(tuple(_zobristRandom.getrandbits(64) for _ in CARDS)
+                       for _ in range(N_PLAYERS)) # By seat, card index
+ZOBRIST_TRICK  = tuple(tuple(_zobristRandom.getrandbits(64) for _ in CARDS)
+                       for _ in range(N_PLAYERS)) # By position in trick
+ZOBRIST_LEADER = tuple(_zobristRandom.getrandbits(64)
+                       for _ in range(N_PLAYERS))
+ZOBRIST_GAMES  = {gameType: _zobristRandom.getrandbits(64)
+                  for gameType in GAMES}
 
 def flatten(listOfLists):
     """Return the entries of the input's sublists (list)."""
     if type(listOfLists[0]) == list:
-        return sum(listOfLists, []) # No idea why this works
+        return [item for sublist in listOfLists for item in sublist]
     else:
         return listOfLists
 
@@ -119,59 +306,179 @@ class Round:
 
     Methods whose names begin with 'get_' retrieve a move from an AI player
     object on their turn.  Taken together these specify all the methods needed
-    for a complete AI class.
+    for a complete AI class, apart from the reset() and assess_hand() calls
+    made at the start of every round (see play_skat).  Each asks through
+    ask(), which can hold players to a time control (see set_time_control()).
 
     bidHistory (list of int/bool): Chronological bids so far (incl. OK/pass).
     cardsDeclarerTook (list of str): Cards taken so far by the declarer.
     cardsDefendersTook (list of str): Ditto for the other team.
     cardsLeft (list of str): Cards that not all players have seen yet.
+    cardsPlayersTook (list of lists): Cards taken so far by each player.
+    clocks (list of float): Seconds each seat has left this round (None if
+      there is no round clock).
     currentBid (int): Highest bid so far (ignoring OK/pass).
     currentTrick (list of str): The 0-3 cards played so far this trick. 
     declaration (list of str): See module-level docstring.
     h (list of obj): One Hand per player.  NOT public info.
     jackMultiplier (0 < int < 12): See jack_multiplier().
+    deck (list of str): The most recent deal, in dealing order.  NOT public
+      info.
     kitty (list of str): Two cards, either for declarer to pick up or already
       discarded by her.  NOT public info.
+    leader (int): Seat that led (or is to lead) the current trick.
+    moveTime, roundTime (float): The time control (see set_time_control()).
     playHistory (list of str): Chronological cards played so far.
-    verbosity (str): How much to show ('silent', 'scores', or 'verbose').
-    zazz (list of str): Schnazzy indented headings for verbose output.
+    rng (obj): The random.Random that deals, for players to draw from too.
+      Seed it through reset() to make a round reproducible.
+    sink (obj): Observer of the round's events (see skat_events).
+    timeouts (list of tuples): (seat, method name, fallback move) for each
+      decision this round that a player failed to make in time.
+    lateCalls (dict): By player, the thread of a timed call that was late
+      and is still running (see ask()).  Kept from round to round.
+    stateKey (int): Zobrist key of the current trick, leader, and game type
+      (see ZOBRIST_TRICK).  Combined with the hands' keys by zobrist.
+    undoStack (list of tuples): What unmake_move() needs to take back each
+      make_move() not yet taken back.
+    verbosity (str): How much to show ('silent', 'scores', 'verbose', or
+      'json'; see skat_events.SINKS).
+
+    The four card piles above are read-only views; the engine itself updates
+    the masks cardsDeclarerMask, cardsDefendersMask, cardsLeftMask, and
+    cardsPlayersMasks (one per player).
+
+    The property zobrist is a 64-bit key of who holds what, the trick so far,
+    its leader, and the game type, kept up to date incrementally.  Search bots
+    and analysis tools can key transposition tables and caches on it.  They
+    can also try moves on the Round itself with make_move() and take them
+    back with unmake_move(), rather than copying it.
     """
 
-    def __init__(self, names, verbosity):
-        """Instantiate a Round and its three Hand sub-objects."""
+    def __init__(self, names, verbosity, sink=None):
+        """Instantiate a Round and its three Hand sub-objects.
+
+        sink (obj): Optionally, an event sink to use instead of the one
+          verbosity calls for.
+        """
         self.h = [self.Hand(i, names[i]) for i in range(N_PLAYERS)]
-        self.whoseTurn = 0
         self.declaration = []
 
         self.bidHistory  = []
         self.playHistory = []
+        self.currentTrick = []
+        self.undoStack = []
+
+        self.cardsPlayersMasks = [0, 0, 0] # For minigame
+        self.deck = list(CARDS) # Reused by every deal
+        self.rng = random.Random()
+        self.moveTime = self.roundTime = None
+        self.deadline = None # When the decision being made is due
+        self.clocks = [None, None, None]
+        self.timeouts = []
+        self.lateCalls = {} # Threads of late players still deciding
+
+        self.verbosity = None
+        self.reset(names, verbosity)
+        if sink is not None:
+            self.sink = sink
+
+    def reset(self, names=None, verbosity=None, seed=None):
+        """Return to the state of a newly instantiated Round, in place.
+
+        Lets one Round be reused for many rounds of skat without reallocating
+        its hands and lists.  names and verbosity default to their old values,
+        and the event sink is kept unless verbosity changes.  If seed (int) is
+        given, rng is reseeded with it, so that the deal and everything the
+        players draw from rng are the same every time.
+        """
+        if seed is not None:
+            self.rng.seed(seed)
+        for hand in self.h:
+            hand.reset()
+        if names is not None:
+            for hand, name in zip(self.h, names):
+                hand.name = name
+        if verbosity is not None and verbosity != self.verbosity:
+            self.verbosity = verbosity
+            self.sink = make_sink(verbosity)
+
+        self.whoseTurn = 0
+        self.leader = 0
+        self.stateKey = ZOBRIST_LEADER[0]
+        self.declarer = None
+        self.jackMultiplier = None
+        self.declaration.clear()
+
+        self.bidHistory.clear()
+        self.playHistory.clear()
+        self.undoStack.clear()
+        self.clocks[:] = [self.roundTime] * N_PLAYERS
+        self.timeouts.clear()
 
         self.currentBid   = LEGAL_BIDS[0] - 1 # Initialize to below min bid.
         self.currentTrick = []
 
-        self.cardsDeclarerTook  = []
-        self.cardsDefendersTook = []
-        self.cardsPlayersTook   = [[], [], []] # For minigame
-        
-        self.verbosity = verbosity
-        self.zazz = ['[BIDS]  ', '[HANDS] ', '[KITTY] ', '[TRICKS]']
+        self.cardsDeclarerMask  = 0
+        self.cardsDefendersMask = 0
+        self.cardsPlayersMasks[:] = (0, 0, 0)
+        self.cardsLeftMask      = FULL_DECK
+
+    @property
+    def cardsDeclarerTook(self):
+        return mask_to_cards(self.cardsDeclarerMask)
+
+    @property
+    def cardsDefendersTook(self):
+        return mask_to_cards(self.cardsDefendersMask)
+
+    @property
+    def cardsLeft(self):
+        return mask_to_cards(self.cardsLeftMask)
+
+    @property
+    def cardsPlayersTook(self):
+        return [mask_to_cards(mask) for mask in self.cardsPlayersMasks]
+
+    @property
+    def zobrist(self):
+        h = self.h
+        return self.stateKey ^ h[0].key ^ h[1].key ^ h[2].key
+
+    def rebuild_state_key(self):
+        """Compute stateKey from scratch, e.g. after setting fields by hand."""
+        key = ZOBRIST_LEADER[self.leader]
+        if self.declaration and self.declaration[0] in ZOBRIST_GAMES:
+            key ^= ZOBRIST_GAMES[self.declaration[0]]
+        for i, card in enumerate(self.currentTrick):
+            key ^= ZOBRIST_TRICK[i][CARD_INDICES[card]]
+        self.stateKey = key
 
     def generate_deck(self):
         """Construct a deck, shuffle, and deal."""
-        deck = []
-        for suit in SUITS:
-            for value in ORDER:
-                deck.append(value + suit)
-
-        self.cardsLeft = deck # Start keeping track of unplayed cards.
+        deck = self.deck
+        deck[:] = CARDS # In place; every shuffle starts from the same order.
+        self.rng.shuffle(deck)
+        self.deal()
+
+    def deal(self, deck=None):
+        """Deal a deck (list of str, default self.deck) in dealing order."""
+        if deck is not None:
+            self.deck[:] = deck
+        deck = self.deck
+        self.cardsLeftMask = FULL_DECK # Start keeping track of unplayed cards.
 
-        random.shuffle(deck)
-        
         self.h[0].add(deck[:10])   # Deal to hands ...
         self.h[1].add(deck[10:20]) #
         self.h[2].add(deck[20:30]) #
         self.kitty = deck[30:]     # ... and to kitty.
         self.oldKitty = self.kitty
+        self.sink.deal(self)
+
+    def declare_minigame(self):
+        """Set up the minigame, played as a grand when everyone passes."""
+        self.declarer = None
+        self.declaration[:] = ['grand']
+        self.stateKey ^= ZOBRIST_GAMES['grand']
 
     def give_kitty(self):
         """Add cards from kitty to declarer's hand."""
@@ -195,32 +502,16 @@ class Round:
         been played.
         """
 
-        if self.declarer == None:
-            handName = "No one"
-        else:
-            hand = self.h[self.declarer]
-            handName = hand.name
         declaration = self.declaration
         gameType = declaration[0]
 
-        if self.verbosity == 'verbose':
-            print('{} calls {}'.format(handName, ', '.join(declaration)))
-
         for i in range(N_PLAYERS):
             self.h[i].reorganize(gameType) # Reorganize everyone's hands.
-            if self.verbosity == 'verbose':
-                self.h[i].show(self.zazz[1])
-                self.zazz[1] = ' ' * len(self.zazz[1])
-
-        if self.verbosity == 'verbose':
-            kittyS = '{} {} {}' \
-                     .format(self.zazz[2], self.oldKitty[0], self.oldKitty[1])
-            if not ('no kitty' in self.declaration or handName == "No one"):
-                kittyS += ' --> {} {}'.format(self.kitty[0], self.kitty[1])
-            print(kittyS)
+        self.sink.declare(self, self.declarer, declaration)
 
         if self.declarer == None:
             return False # Minigame
+        hand = self.h[self.declarer]
 
         #
         # Overbidding a null game should never happen since the kitty, points
@@ -232,13 +523,8 @@ class Round:
             assert self.currentBid <= gameValue
             return False
 
-        handTrumps = hand.cards[-1]
-        kittyTrumps = []
-        for card in self.kitty:
-            if card[0] == 'j' or card[1] == gameType[0]:
-                kittyTrumps.append(card)
-        heldTrumps = handTrumps + kittyTrumps
-        self.jackMultiplier = jack_multiplier(heldTrumps, gameType)
+        self.jackMultiplier = jack_multiplier_mask(
+            hand.mask | cards_to_mask(self.kitty), gameType)
 
         gameValue = game_value(declaration, False, self.jackMultiplier)
         if self.currentBid > gameValue:
@@ -247,95 +533,135 @@ class Round:
 
     def round_up_overbid(self, bid, gameType):
         """Return next multiple (int > 0) of game's base value."""
-        if self.verbosity == 'verbose':
-            print('Overbid!')
         while bid % BASE_VALUES[gameType] != 0:
             bid += 1
+        self.sink.overbid(self, bid)
         return bid
 
     def next_turn(self):
         """Figure out whose turn is next and do various book-keeping."""
+        leader, trick = self.leader, self.currentTrick
+        trickWinner = self.advance_turn()
+        if trickWinner is not None:
+            self.sink.trick(self, leader, trick, trickWinner)
+
+    def advance_turn(self):
+        """Do the book-keeping of next_turn() silently.
+
+        Returns the trick winner's seat (int) if the trick just finished,
+        otherwise None.
+        """
         whoseTurn = self.whoseTurn
-        gameType = self.declaration[0]
         trick = self.currentTrick
 
         if len(trick) < 3: # Trick is not finished yet; continue clockwise.
             self.whoseTurn = (whoseTurn + 1) % N_PLAYERS
+            return None
+
+        # Award trick to whoever played the strongest card.
+        strengths = TRICK_STRENGTHS[self.declaration[0]][trick[0]]
+        a, b, c = strengths[trick[0]], strengths[trick[1]], \
+                  strengths[trick[2]]
+        if a > b and a > c:
+            highCard = 0
+        elif b > c:
+            highCard = 1
+        else:
+            highCard = 2
 
-        else: # Award trick to whoever played the strongest card.
-            highCardStrength = -1
-            suitLed = trick[0][1]
-
-            if gameType == 'null':
-                order = NULL_ORDER
-            else:
-                order = ORDER
-
-            allTrumps = all_trumps(gameType)
-            trumped = False
-            for card in trick:
-                if card in allTrumps:
-                    trumped = True
-
-            strength = -1
-            for card in trick:
-                if trumped:
-                    if card not in allTrumps:
-                        continue
-                    strength = allTrumps.index(card)
-                else:
-                    if card[1] == suitLed:
-                        strength = order.index(card[0])
-
-                if strength > highCardStrength:
-                    highCard, highCardStrength = card, strength
+        trickWinner = (whoseTurn + highCard + 1) % N_PLAYERS
+        trickMask = cards_to_mask(trick)
+        self.cardsPlayersMasks[trickWinner] |= trickMask
+        if trickWinner == self.declarer:
+            self.cardsDeclarerMask |= trickMask
+        else:
+            self.cardsDefendersMask |= trickMask
 
-            trickWinner = (whoseTurn + trick.index(highCard) + 1) % N_PLAYERS
-            self.cardsPlayersTook[trickWinner] += trick
-            if trickWinner == self.declarer:
-                self.cardsDeclarerTook += trick
-            else:
-                self.cardsDefendersTook += trick
+        self.stateKey ^= ZOBRIST_TRICK[0][CARD_INDICES[trick[0]]] ^ \
+                         ZOBRIST_TRICK[1][CARD_INDICES[trick[1]]] ^ \
+                         ZOBRIST_TRICK[2][CARD_INDICES[trick[2]]] ^ \
+                         ZOBRIST_LEADER[self.leader] ^ \
+                         ZOBRIST_LEADER[trickWinner]
+        self.currentTrick = []
+        self.whoseTurn = self.leader = trickWinner
+        return trickWinner
 
-            if self.verbosity == 'verbose':
-                print(self.zazz[3], '{} leads {} {} {} --> {}'
-                      .format(self.h[(whoseTurn + 1) % N_PLAYERS].name,
-                              trick[0], trick[1], trick[2],
-                              self.h[trickWinner].name))
-                self.zazz[3] = ' ' * len(self.zazz[3])
+    def make_move(self, card):
+        """Play a card for whoever's turn it is and move on to the next turn.
 
-            self.currentTrick = []
-            self.whoseTurn = trickWinner
+        The same as get_play() followed by next_turn(), except that no AI is
+        asked, nothing is printed, and the move is recorded so that
+        unmake_move() can take it back.  The card is assumed to be legal.
+        Meant for search: a bot can try a line of play on the Round itself
+        and then restore it, instead of copying it.
+        """
+        whoseTurn, leader, trick = self.whoseTurn, self.leader, \
+                                   self.currentTrick
+        self.play_card(card)
+        self.undoStack.append((card, whoseTurn, leader, trick,
+                               self.advance_turn()))
+
+    def unmake_move(self):
+        """Take back the last make_move(), in constant time."""
+        card, whoseTurn, leader, trick, trickWinner = self.undoStack.pop()
+        if trickWinner is not None: # Take the finished trick back.
+            trickMask = cards_to_mask(trick)
+            self.cardsPlayersMasks[trickWinner] &= ~trickMask
+            self.cardsDeclarerMask &= ~trickMask
+            self.cardsDefendersMask &= ~trickMask
+            self.stateKey ^= ZOBRIST_TRICK[0][CARD_INDICES[trick[0]]] ^ \
+                             ZOBRIST_TRICK[1][CARD_INDICES[trick[1]]] ^ \
+                             ZOBRIST_TRICK[2][CARD_INDICES[trick[2]]] ^ \
+                             ZOBRIST_LEADER[leader] ^ \
+                             ZOBRIST_LEADER[trickWinner]
+            self.currentTrick = trick
+            self.leader = leader
+        self.whoseTurn = whoseTurn
+
+        trick.pop()
+        self.stateKey ^= ZOBRIST_TRICK[len(trick)][CARD_INDICES[card]]
+        self.playHistory.pop()
+        self.cardsLeftMask |= CARD_BITS[card]
+        self.h[whoseTurn].add((card,))
 
     def legal_plays(self, hand):
-        """Return legal plays (list) from this hand for the current trick."""
+        """Return legal plays (tuple) from this hand for the current trick.
+
+        The tuple is shared with the hand (see Hand.slots and Hand.flat), so
+        no list is built per call.
+        """
         if len(self.currentTrick) == 0:
-            return flatten(hand.cards)
+            return hand.flat
 
-        cardLed = self.currentTrick[0]
-        if cardLed in all_trumps(self.declaration[0]):
-            legalPlays = hand.cards[-1]
+        gameType = self.declaration[0]
+        slot = CARD_SLOTS[gameType][CARD_INDICES[self.currentTrick[0]]]
+        if hand.mask & SLOT_MASKS[gameType][slot] == 0: # Can't follow suit
+            return hand.flat # May play any card
         else:
-            legalPlays = hand.cards[SUITS.find(cardLed[1])]
+            return hand.slots[slot]
 
-        if legalPlays == []: # Can't follow suit
-            return flatten(hand.cards) # May play any card
-        else:
-            return legalPlays
+    def legal_mask(self, hand):
+        """Return legal plays (mask) from this hand for the current trick."""
+        if len(self.currentTrick) == 0:
+            return hand.mask
+
+        gameType = self.declaration[0]
+        slot = CARD_SLOTS[gameType][CARD_INDICES[self.currentTrick[0]]]
+        return hand.mask & SLOT_MASKS[gameType][slot] or hand.mask
 
     def score(self):
         """Add up cards to see if declarer won.  Return her score (int)."""
-        points = sum([POINTS[card[0]] \
-                      for card in self.cardsDeclarerTook + self.kitty])
+        points = card_points(self.cardsDeclarerMask |
+                             cards_to_mask(self.kitty))
 
         if points >= TOTAL_POINTS * 3/4:
             self.declaration.append('takes three quarters')
         elif points <= TOTAL_POINTS * 1/4:
             self.declaration.append('loses three quarters')
 
-        if self.cardsDefendersTook == []:
+        if self.cardsDefendersMask == 0:
             self.declaration.append('takes everything!')
-        elif self.cardsDeclarerTook == []:
+        elif self.cardsDeclarerMask == 0:
             self.declaration.append('loses everything!')
 
         d = self.declaration
@@ -357,44 +683,176 @@ class Round:
                 gameValue = self.round_up_overbid(self.currentBid, d[0])
             out = -2 * gameValue
 
-        if self.verbosity == 'verbose':
-            if len(d) > 1:
-                print(', '.join(d[1:]))
-            print('{} took {} points; scores {}' \
-                  .format(self.h[self.declarer].name, points, out))
-        elif self.verbosity == 'scores':
-            print('{} {}'.format(self.h[self.declarer].name, out))
-
+        self.sink.score(self, self.declarer, points, out)
         return out
 
     def score_minigame(self):
-        points = [sum([POINTS[c[0]] for c in self.cardsPlayersTook[i]])
-                  for i in range(N_PLAYERS)] 
+        points = [card_points(mask) for mask in self.cardsPlayersMasks]
 
         maxPoints = max(points)
         for i in range(N_PLAYERS):
             if points[i] == maxPoints: # Winner(s)!
-                points[i] += sum([POINTS[c[0]] for c in self.kitty])
+                points[i] += card_points(cards_to_mask(self.kitty))
 
         scores = [-1 * p for p in points]
 
-        if self.verbosity == 'verbose':
-            for i in range(N_PLAYERS):
-                print('{} scores {}'.format(self.h[i].name, scores[i]))
-        elif self.verbosity == 'scores':
-            outStr = ''
-            for i in range(N_PLAYERS):
-                outStr += '{} {}, '.format(self.h[i].name, scores[i])
-            print(outStr[:-2])
-
+        self.sink.minigame_score(self, scores)
         return scores
 
+    def set_time_control(self, moveTime=None, roundTime=None):
+        """Limit the time players may take to decide (None: no limit).
+
+        moveTime (float): Seconds per decision.
+        roundTime (float): Seconds per seat for all its decisions in a round,
+          counted down across them like a chess clock and reset every round.
+
+        A player out of time is not waited for: the engine makes a fallback
+        move for it (see ask()).  It can't stop the player's thread, though,
+        which runs on until the call returns.  Players can check
+        time_remaining().
+        """
+        self.moveTime = moveTime
+        self.roundTime = roundTime
+        self.clocks[:] = [roundTime] * N_PLAYERS
+
+    def time_remaining(self):
+        """Return the seconds (float) left for the decision being made.
+
+        Infinite if there is no time control.  For players, e.g. to search
+        for as long as they may.
+        """
+        if self.deadline is None:
+            return math.inf
+        return max(0.0, self.deadline - time.monotonic())
+
+    def ask(self, p, seat, method, view, fallback):
+        """Return what AI p's method (str) decides for seat, in time.
+
+        The method is called with view (seat's Hand, or its cards) and the
+        Round.  Without a time control, that is all.  With one, the call runs
+        in a thread that is given until the deadline.  The engine can't
+        interrupt a thread, so a late call runs on until it returns, its
+        answer ignored (as is an error raised once the time is up, e.g. by a
+        player that stopped waiting at the deadline); until it does, that
+        player isn't asked again, in this round or the next, so a hung bot
+        costs one thread, not one per decision.  Meanwhile, and whenever a
+        call is late, fallback() (a function) makes the move instead, which
+        is recorded in timeouts and reported to the sink.
+
+        A timed call is given a snapshot() of the Round and the same view of
+        it, so a late call can't touch the round as it goes on.  An answer
+        in time carries over what the player drew from the snapshot's rng,
+        so seeded rounds play as they would without a time control.
+        """
+        decide = getattr(p, method)
+        limit = self.decision_limit(seat)
+        if limit is None:
+            return decide(view, self)
+
+        late = self.lateCalls.get(p)
+        if late is not None:
+            if late.is_alive():
+                return self.fall_back(seat, method, fallback)
+            del self.lateCalls[p]
+
+        start = self.start_decision(limit)
+        deadline = self.deadline
+        if limit > 0:
+            snapshot = self.snapshot()
+            hand = snapshot.h[seat]
+            snapshotView = hand if view is self.h[seat] else hand.cards
+            outcome = []
+            def call():
+                try:
+                    outcome.append((True, decide(snapshotView, snapshot)))
+                except BaseException as e: # Re-raised below, in this thread
+                    if time.monotonic() < deadline: # Else it is just late.
+                        outcome.append((False, e))
+
+            thread = threading.Thread(target=call, daemon=True)
+            thread.start()
+            thread.join(limit)
+            if thread.is_alive():
+                self.lateCalls[p] = thread
+        self.end_decision(seat, start)
+
+        if limit > 0 and outcome:
+            ok, result = outcome[0]
+            if not ok:
+                raise result
+            self.rng.setstate(snapshot.rng.getstate())
+            return result
+        return self.fall_back(seat, method, fallback)
+
+    def snapshot(self):
+        """Return a copy of the Round (obj) that shares nothing mutable.
+
+        Its rng starts in the same state but draws apart, and its sink
+        ignores every event.
+        """
+        snapshot = copy.copy(self)
+        for name, value in vars(self).items():
+            if type(value) is list:
+                setattr(snapshot, name, list(value))
+        snapshot.h = [hand.copy() for hand in self.h]
+        snapshot.rng = random.Random()
+        snapshot.rng.setstate(self.rng.getstate())
+        snapshot.sink = EventSink()
+        snapshot.lateCalls = {}
+        return snapshot
+
+    def decision_limit(self, seat):
+        """Return the seconds (float) seat has to decide (None: no limit)."""
+        if self.moveTime is None and self.roundTime is None:
+            return None
+        return min(math.inf if self.moveTime is None else self.moveTime,
+                   math.inf if self.clocks[seat] is None
+                   else self.clocks[seat])
+
+    def start_decision(self, limit):
+        """Set the deadline limit seconds away; return the time (float)."""
+        start = time.monotonic()
+        self.deadline = start + limit
+        return start
+
+    def end_decision(self, seat, start):
+        """Clear the deadline and charge seat's clock for the time taken."""
+        self.deadline = None
+        if self.clocks[seat] is not None:
+            self.clocks[seat] = max(0.0, self.clocks[seat] -
+                                    (time.monotonic() - start))
+
+    def fall_back(self, seat, method, fallback):
+        """Make, record, and return the fallback move of a seat out of time."""
+        move = fallback()
+        self.timeouts.append((seat, method, move))
+        self.sink.timeout(self, seat, method, move)
+        return move
+
+    def random_discards(self):
+        """Return two random cards (list of str) of the declarer's hand."""
+        return self.rng.sample(self.h[self.declarer].flat, 2)
+
+    def random_play(self):
+        """Return a random legal play (str) for whoever's turn it is."""
+        return self.rng.choice(self.legal_plays(self.h[self.whoseTurn]))
+
+    # Each get_ method below asks a player for a move, then hands it to the
+    # apply_ method of the same step, which checks and makes it.  Drivers
+    # that ask players some other way (see async_skat) call the apply_
+    # methods directly.
+
     def get_bid(self, p, i):
-        """Return AI p's bid (int/bool) for seat i."""
-        bid = p.bid(self.h[i], self)
-        if self.verbosity == 'verbose':
-            print(self.zazz[0], '{} bids {}'.format(self.h[i].name, bid))
-            self.zazz[0] = ' ' * len(self.zazz[0])
+        """Return AI p's bid (int/bool) for seat i.
+
+        Falls back to passing.
+        """
+        return self.apply_bid(i, self.ask(p, i, 'bid', self.h[i],
+                                          lambda: False))
+
+    def apply_bid(self, i, bid):
+        """Make seat i's bid (int/bool) and return it."""
+        self.sink.bid(self, i, bid)
         if len(self.bidHistory) > 0 and type(self.bidHistory[-1]) is int:
             assert type(bid) is bool # Can't have two numeric bids in a row.
         elif type(bid) is int:
@@ -405,34 +863,56 @@ class Round:
         return bid
 
     def get_kitty_declaration(self, p, i):
-        """Return AI p's decision whether to take kitty (bool) for seat i."""
-        declaration = p.kitty(self.h[i].cards, self)
+        """Return AI p's decision whether to take kitty (bool) for seat i.
+
+        Falls back to taking it.
+        """
+        return self.apply_kitty_declaration(
+            i, self.ask(p, i, 'kitty', self.h[i].cards, lambda: True))
+
+    def apply_kitty_declaration(self, i, declaration):
+        """Make seat i the declarer, taking the kitty or not (bool)."""
         assert type(declaration) is bool
 
         if not declaration:
             self.declaration.append('no kitty')
-            if self.verbosity == 'verbose':
-                print('skips the kitty!')
+            self.sink.skip_kitty(self, i)
         self.declarer = i
         return declaration
 
     def get_kitty_discards(self, p):
-        """Return AI p's kitty discards (list of str) for declarer."""
-        hand = self.h[self.declarer]
-        discards = p.discard(hand, self)
+        """Return AI p's kitty discards (list of str) for declarer.
+
+        Falls back to two random cards.
+        """
+        self.apply_kitty_discards(self.ask(p, self.declarer, 'discard',
+                                           self.h[self.declarer],
+                                           self.random_discards))
+
+    def apply_kitty_discards(self, discards):
+        """Move the declarer's discards (list of str) to the kitty."""
         assert len(discards) == len(discards[0]) == len(discards[1]) == 2
 
+        hand = self.h[self.declarer]
         self.kitty = []
         for discard in discards:
             hand.drop(discard)
             self.kitty.append(discard)
 
     def get_declaration(self, p):
-        """Return AI p's declaration (list of str)."""
-        declaration = p.declare(self.h[self.declarer], self)
+        """Return AI p's declaration (list of str).
+
+        Falls back to a plain grand.
+        """
+        self.apply_declaration(self.ask(p, self.declarer, 'declare',
+                                        self.h[self.declarer],
+                                        lambda: ['grand']))
 
+    def apply_declaration(self, declaration):
+        """Check and record the declarer's declaration (list of str)."""
         assert declaration[0] in GAMES
         self.declaration.insert(0, declaration[0])
+        self.stateKey ^= ZOBRIST_GAMES[declaration[0]]
 
         for item in declaration[1:]:
             assert item in EXTRAS
@@ -448,14 +928,21 @@ class Round:
             assert len(declaration) == 1
     
     def get_play(self, p):
-        """Return AI p's play (str) for whoever's turn it is."""
-        hand = self.h[self.whoseTurn]
-        cardToPlay = p.play(hand, self)
-        
-        hand.drop(cardToPlay)
-        self.cardsLeft.remove(cardToPlay)
-        self.playHistory.append(cardToPlay)
-        self.currentTrick.append(cardToPlay)
+        """Return AI p's play (str) for whoever's turn it is.
+
+        Falls back to a random legal play.
+        """
+        self.play_card(self.ask(p, self.whoseTurn, 'play',
+                                self.h[self.whoseTurn], self.random_play))
+
+    def play_card(self, card):
+        """Move a card from the hand whose turn it is to the current trick."""
+        self.h[self.whoseTurn].drop(card)
+        self.cardsLeftMask &= ~CARD_BITS[card]
+        self.playHistory.append(card)
+        self.stateKey ^= ZOBRIST_TRICK[len(self.currentTrick)] \
+                                      [CARD_INDICES[card]]
+        self.currentTrick.append(card)
 
 
     class Hand:
@@ -463,70 +950,98 @@ class Round:
 
         cards (list of lists): One sublist per suit, in the order diamonds,
           spades, hearts, clubs, trump.  Note that in a null or suit game, one
-          suit will always be empty.
+          suit will always be empty.  Until the hand is reorganized, all cards
+          sit in the trump sublist.  This is a read-only view of mask.
+        flat (tuple of str): All the cards, in the same order as cards.
+        gameType (str): How cards is organized (None if not yet).
+        key (int): Zobrist key of the cards in the hand (see ZOBRIST_HANDS).
+        mask (int): The cards in the hand (see module-level docstring).
         seat (int): Player ID number (0, 1, or 2).
+        slots (tuple of tuples): Same as cards, but immutable.
+
+        The views cards, flat, and slots are cached until the hand changes.
         """
 
         def __init__(self, seat, name):
             """Instantiate a Hand."""
-            self.cards = [[], [], [], [], []] # D, S, H, C, trump
             self.seat = seat 
             self.name = name
-
-        def show(self, zazz):
-            """Print cards (verbose output only)."""
+            self.reset()
+
+        def reset(self):
+            """Empty the hand, in place."""
+            self.mask = 0
+            self.key = 0
+            self.gameType = None
+            self.changed()
+
+        def copy(self):
+            """Return a copy of the hand (obj)."""
+            hand = copy.copy(self)
+            hand._cards = None # The only mutable view
+            return hand
+
+        def changed(self):
+            """Drop the cached views of mask, which are rebuilt when needed."""
+            self._slots = self._cards = self._flat = None
+
+        @property
+        def slots(self):
+            if self._slots is None:
+                mask, gameType = self.mask, self.gameType
+                if gameType is None:
+                    self._slots = ((), (), (), (), tuple(mask_to_cards(mask)))
+                else:
+                    suitViews, trumpShift, trumpViews, jackViews = \
+                        SLOT_VIEWS[gameType]
+                    self._slots = (suitViews[0][mask & 0xff],
+                                   suitViews[1][mask >> 8 & 0xff],
+                                   suitViews[2][mask >> 16 & 0xff],
+                                   suitViews[3][mask >> 24],
+                                   trumpViews[mask >> trumpShift & 0x7f] +
+                                   jackViews[jack_bits(mask)])
+            return self._slots
+
+        @property
+        def cards(self):
+            if self._cards is None:
+                self._cards = [list(slot) for slot in self.slots]
+            return self._cards
+
+        @property
+        def flat(self):
+            if self._flat is None:
+                s = self.slots
+                self._flat = s[0] + s[1] + s[2] + s[3] + s[4]
+            return self._flat
+
+        def show(self, zazz, file=None):
+            """Print cards under a heading (verbose output only)."""
             out = []
             for suit in self.cards:
                 out.append(' '.join(suit))
-            print(zazz, self.name + ':', ' | '.join(out))
+            print(zazz, self.name + ':', ' | '.join(out), file=file)
 
         def add(self, newCards):
-            """Add a list of cards to the hand without sorting."""
-            self.cards[-1] += newCards # Add to trump suit arbitrarily.
+            """Add a list of cards to the hand."""
+            keys = ZOBRIST_HANDS[self.seat]
+            for card in newCards:
+                bit = CARD_BITS[card]
+                if not self.mask & bit:
+                    self.mask |= bit
+                    self.key ^= keys[CARD_INDICES[card]]
+            self.changed()
 
         def drop(self, card):
             """Discard a card from the hand."""
-            for suit in self.cards:
-                if card in suit:
-                    suit.remove(card)
-                    break
+            if self.mask & CARD_BITS[card]:
+                self.mask ^= CARD_BITS[card]
+                self.key ^= ZOBRIST_HANDS[self.seat][CARD_INDICES[card]]
+            self.changed()
 
         def reorganize(self, gameType):
             """Move all cards to the correct suit and sort within each suit."""
             if gameType == None: # No organization needed
                 return
-
-            # Undesignate suits, preparing to redistribute.
-            newCards = [card for suit in self.cards for card in suit]
-            self.cards = [[], [], [], [], []]
-
-            if gameType == 'grand':
-                for card in newCards:
-                    if card[0] == 'j':
-                        self.cards[4].append(card)
-                    else:
-                        self.cards[SUITS.find(card[1])].append(card)
-                def sortKey(card):
-                    return 10 * SUITS.find(card[1]) + ORDER.find(card[0])
-
-            elif gameType == 'null':
-                for card in newCards:
-                    self.cards[SUITS.find(card[1])].append(card)
-                order = NULL_ORDER
-                def sortKey(card):
-                    return 10 * SUITS.find(card[1]) + NULL_ORDER.find(card[0])
-
-            else:                 # Suit game (four possible types)
-                for card in newCards:
-                    if card[0] == 'j' or card[1] == gameType[0]:
-                        self.cards[4].append(card)
-                    else:
-                        self.cards[SUITS.find(card[1])].append(card)
-                def sortKey(card):
-                    key = 10 * SUITS.find(card[1]) + ORDER.find(card[0])
-                    if card[0] == 'j':
-                        key += 100 # Make sure jacks sort above other trump.
-                    return key
-
-            # Now that the cards are in the correct suits, sort each suit.
-            self.cards = [sorted(suit, key=sortKey) for suit in self.cards]
+            self.gameType = gameType
+            self.changed()
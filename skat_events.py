@@ -0,0 +1,197 @@
+"""Observers of what happens during a round of skat.
+
+The Round (see skat_classes) does no output of its own.  Instead it reports
+each event -- a deal, a bid, a declaration, a trick, a score -- to an event
+sink by calling the sink method of the same name.  Every method takes the
+Round first, followed by the event's own data.
+
+EventSink ignores every event, so a silent Round pays only for a call to an
+empty method, never for formatting.  To observe a round, subclass it and
+override the events of interest, as the sinks below do:
+  ScoreSink: Prints each round's result ('scores' verbosity).
+  TextSink: Prints the round play by play ('verbose' verbosity).
+  JsonLinesSink: Writes each event as a line of JSON ('json' verbosity).
+
+Only the sinks' Round argument is assumed to come from skat_classes, which
+imports this module.
+"""
+
+import sys
+
+ZAZZ = ('[BIDS]  ', '[HANDS] ', '[KITTY] ', '[TRICKS]') # See TextSink
+
+class EventSink:
+    """Ignore every event of a round.
+
+    seat (int): The seat of the player concerned (0, 1, or 2).
+    declarer (int): The declarer's seat (None in the minigame).
+    file (obj): Where sinks that print write (None for whatever sys.stdout
+      is at the time).
+    """
+
+    def __init__(self, file=None):
+        self.file = file
+
+    def deal(self, r):
+        """The cards have just been dealt (see r.h and r.kitty)."""
+
+    def bid(self, r, seat, bid):
+        """A player has bid (int/bool, see skat_classes)."""
+
+    def skip_kitty(self, r, seat):
+        """The declarer has chosen to play without the kitty."""
+
+    def declare(self, r, declarer, declaration):
+        """The game is declared and everyone's hand sorted for it."""
+
+    def overbid(self, r, bid):
+        """The declarer overbid; the bid (int) is rounded up."""
+
+    def trick(self, r, leader, trick, winner):
+        """A trick (list of str) led by seat leader has been won."""
+
+    def timeout(self, r, seat, method, move):
+        """A player ran out of time; the engine made a move for it."""
+
+    def score(self, r, declarer, points, score):
+        """The declarer took points (int) and scored score (int)."""
+
+    def minigame_score(self, r, scores):
+        """Everyone passed; each seat scored scores (list of int)."""
+
+
+class ScoreSink(EventSink):
+    """Print the result of each round."""
+
+    def score(self, r, declarer, points, score):
+        print('{} {}'.format(r.h[declarer].name, score), file=self.file)
+
+    def minigame_score(self, r, scores):
+        print(', '.join('{} {}'.format(r.h[i].name, score)
+                        for i, score in enumerate(scores)), file=self.file)
+
+
+class TextSink(EventSink):
+    """Print each round play by play.
+
+    zazz (list of str): Schnazzy indented headings, each printed before the
+      first line of its section and replaced by spaces after.
+    """
+
+    def __init__(self, file=None):
+        super().__init__(file)
+        self.zazz = list(ZAZZ)
+
+    def heading(self, section):
+        """Return the heading (str) of a section and blank it for next time."""
+        heading = self.zazz[section]
+        self.zazz[section] = ' ' * len(heading)
+        return heading
+
+    def deal(self, r):
+        self.zazz[:] = ZAZZ
+
+    def bid(self, r, seat, bid):
+        print(self.heading(0), '{} bids {}'.format(r.h[seat].name, bid),
+              file=self.file)
+
+    def skip_kitty(self, r, seat):
+        print('skips the kitty!', file=self.file)
+
+    def declare(self, r, declarer, declaration):
+        name = 'No one' if declarer is None else r.h[declarer].name
+        print('{} calls {}'.format(name, ', '.join(declaration)),
+              file=self.file)
+        for hand in r.h:
+            hand.show(self.heading(1), self.file)
+
+        kittyS = '{} {} {}'.format(self.heading(2), r.oldKitty[0],
+                                   r.oldKitty[1])
+        if not ('no kitty' in declaration or declarer is None):
+            kittyS += ' --> {} {}'.format(r.kitty[0], r.kitty[1])
+        print(kittyS, file=self.file)
+
+    def overbid(self, r, bid):
+        print('Overbid!', file=self.file)
+
+    def timeout(self, r, seat, method, move):
+        print('{} ran out of time ({}); made {}'.format(r.h[seat].name,
+                                                        method, move),
+              file=self.file)
+
+    def trick(self, r, leader, trick, winner):
+        print(self.heading(3), '{} leads {} {} {} --> {}'
+              .format(r.h[leader].name, trick[0], trick[1], trick[2],
+                      r.h[winner].name), file=self.file)
+
+    def score(self, r, declarer, points, score):
+        if len(r.declaration) > 1:
+            print(', '.join(r.declaration[1:]), file=self.file)
+        print('{} took {} points; scores {}'.format(r.h[declarer].name, points,
+                                                    score), file=self.file)
+
+    def minigame_score(self, r, scores):
+        for i, score in enumerate(scores):
+            print('{} scores {}'.format(r.h[i].name, score), file=self.file)
+
+
+class JsonLinesSink(EventSink):
+    """Write each event as one JSON object per line.
+
+    Every object has an 'event' key naming the event, plus the event's data.
+    Unlike the printed output, deal and declare events include the hands and
+    the kitty, so a round can be reconstructed from its lines.
+    """
+
+    def __init__(self, file=None):
+        super().__init__(file)
+        import json # Only needed here
+        self.dumps = json.dumps
+
+    def write(self, event, **data):
+        data['event'] = event
+        (self.file or sys.stdout).write(self.dumps(data) + '\n')
+
+    def deal(self, r):
+        self.write('deal', hands=[list(hand.flat) for hand in r.h],
+                   kitty=list(r.kitty))
+
+    def bid(self, r, seat, bid):
+        self.write('bid', seat=seat, bid=bid)
+
+    def skip_kitty(self, r, seat):
+        self.write('skip_kitty', seat=seat)
+
+    def declare(self, r, declarer, declaration):
+        self.write('declare', declarer=declarer,
+                   declaration=list(declaration),
+                   hands=[list(hand.flat) for hand in r.h],
+                   kitty=list(r.oldKitty), discards=list(r.kitty))
+
+    def overbid(self, r, bid):
+        self.write('overbid', bid=bid)
+
+    def timeout(self, r, seat, method, move):
+        self.write('timeout', seat=seat, method=method, move=move)
+
+    def trick(self, r, leader, trick, winner):
+        self.write('trick', leader=leader, trick=list(trick), winner=winner)
+
+    def score(self, r, declarer, points, score):
+        self.write('score', declarer=declarer,
+                   declaration=list(r.declaration), points=points,
+                   score=score)
+
+    def minigame_score(self, r, scores):
+        self.write('minigame_score', scores=list(scores))
+
+
+SINKS = {'silent': EventSink, 'scores': ScoreSink, 'verbose': TextSink,
+         'json': JsonLinesSink}
+
+def make_sink(verbosity, file=None):
+    """Return a new event sink for a verbosity (str, see SINKS).
+
+    file (obj): Where it writes (see EventSink).
+    """
+    return SINKS[verbosity](file)
@@ -0,0 +1,253 @@
+"""Running statistics for the scores of many rounds of skat.
+
+Intended to be imported by the wrapper (skat_wrapper).  Scores are folded into
+accumulators one round at a time, so memory use does not grow with the number
+of rounds played, and accumulators from separate processes can be merged.
+
+Only the math module is imported, to keep the wrapper quick to start.  The
+optional advanced report (advanced_report()) is the one place scipy is used.
+"""
+
+import math
+
+N_PLAYERS = 3
+PAIRS = ((0,1), (0,2), (1,2))
+
+def mean(xs):
+    """Return the mean (float) of a sequence of numbers."""
+    return sum(xs) / len(xs)
+
+def sem(xs):
+    """Return the standard error of the mean (float) of a sequence."""
+    stats = RunningStats()
+    for x in xs:
+        stats.add(x)
+    return stats.sem()
+
+def normal_quantile(p):
+    """Return z (float) such that a standard normal is below z w.p. p."""
+    lo, hi = -40.0, 40.0
+    for _ in range(100): # Bisection; plenty for double precision
+        mid = (lo + hi) / 2
+        if 0.5 * math.erfc(-mid / math.sqrt(2)) < p:
+            lo = mid
+        else:
+            hi = mid
+    return (lo + hi) / 2
+
+def confidence_interval(stats, level=0.95):
+    """Return the (low, high) normal-approximation CI of a mean (tuple)."""
+    halfWidth = normal_quantile(0.5 + level / 2) * stats.sem()
+    return stats.mean - halfWidth, stats.mean + halfWidth
+
+class RunningStats:
+    """Accumulate the mean and variance of a stream of numbers.
+
+    Uses Welford's algorithm, which stays accurate over very long streams.
+
+    n (int): How many numbers have been added.
+    mean (float): Their mean (0 if there are none).
+    m2 (float): Their sum of squared deviations from the mean.
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, x):
+        """Fold one number into the statistics."""
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+
+    def merge(self, other):
+        """Fold another RunningStats into this one (Chan et al.)."""
+        n = self.n + other.n
+        if n == 0:
+            return
+        delta = other.mean - self.mean
+        self.mean += delta * other.n / n
+        self.m2 += other.m2 + delta * delta * self.n * other.n / n
+        self.n = n
+
+    def variance(self):
+        """Return the sample variance (float; nan if fewer than two)."""
+        if self.n < 2:
+            return float('nan')
+        return self.m2 / (self.n - 1)
+
+    def sem(self):
+        """Return the standard error of the mean (float)."""
+        return math.sqrt(self.variance() / self.n) if self.n > 1 \
+               else float('nan')
+
+
+class ScoreBoard:
+    """Running score statistics for the three players of a tournament.
+
+    players (list of obj): One RunningStats per player.
+    seats (list of lists): RunningStats per player (outer) and seat (inner).
+    permutations (dict): RunningStats per player, keyed by seating
+      permutation (tuple of int, see skat_wrapper.PERMUTATIONS).
+    pairs (dict): RunningStats of the per-round score difference between two
+      players, keyed by pair of players (see PAIRS).  Both players of a pair
+      play the same deals, so these paired differences have lower variance
+      than the difference of two means.
+    blocks (list of obj): One RunningStats per player of its mean score over
+      each duplicate block: one deal played in all six seat permutations
+      (only filled in by add_block()).
+    blockPairs (dict): RunningStats of the per-block difference of two
+      players' mean scores, keyed like pairs.  Every player of a block holds
+      every hand once, so the luck of the deal cancels out.
+    timeouts (list of int): Per player, decisions it failed to make in time
+      (see skat_classes.Round.set_time_control()).
+    """
+
+    def __init__(self):
+        self.players = [RunningStats() for _ in range(N_PLAYERS)]
+        self.seats = [[RunningStats() for _ in range(N_PLAYERS)]
+                      for _ in range(N_PLAYERS)]
+        self.permutations = {}
+        self.pairs = {pair: RunningStats() for pair in PAIRS}
+        self.blocks = [RunningStats() for _ in range(N_PLAYERS)]
+        self.blockPairs = {pair: RunningStats() for pair in PAIRS}
+        self.timeouts = [0, 0, 0]
+
+    @property
+    def nRounds(self):
+        return self.players[0].n
+
+    def add(self, permutation, score):
+        """Record one round's scores (list of int, by seat)."""
+        if permutation not in self.permutations:
+            self.permutations[permutation] = [RunningStats()
+                                              for _ in range(N_PLAYERS)]
+        byPermutation = self.permutations[permutation]
+        for seat, p in enumerate(permutation):
+            self.players[p].add(score[seat])
+            self.seats[p][seat].add(score[seat])
+            byPermutation[p].add(score[seat])
+        for a, b in PAIRS:
+            self.pairs[(a, b)].add(score[permutation.index(a)] -
+                                   score[permutation.index(b)])
+
+    def add_timeouts(self, permutation, timeouts):
+        """Count one round's timeouts (list of tuples, see Round.timeouts)."""
+        for seat, _, _ in timeouts:
+            self.timeouts[permutation[seat]] += 1
+
+    def add_block(self, means):
+        """Record a duplicate block's mean scores (list, by player)."""
+        for p in range(N_PLAYERS):
+            self.blocks[p].add(means[p])
+        for a, b in PAIRS:
+            self.blockPairs[(a, b)].add(means[a] - means[b])
+
+    def settled(self, targetSem, pairs=False, duplicate=False):
+        """Return whether every standard error is below targetSem (bool).
+
+        Checks each player's mean, or with pairs, each pair's mean
+        difference; with duplicate, their per-block versions.
+        """
+        if pairs:
+            stats = (self.blockPairs if duplicate else self.pairs).values()
+        else:
+            stats = self.blocks if duplicate else self.players
+        return all(s.sem() < targetSem for s in stats) # False if nan
+
+    def merge(self, other):
+        """Fold another ScoreBoard into this one."""
+        for p in range(N_PLAYERS):
+            self.players[p].merge(other.players[p])
+            for seat in range(N_PLAYERS):
+                self.seats[p][seat].merge(other.seats[p][seat])
+        for permutation, byPermutation in other.permutations.items():
+            if permutation not in self.permutations:
+                self.permutations[permutation] = [RunningStats()
+                                                  for _ in range(N_PLAYERS)]
+            for p in range(N_PLAYERS):
+                self.permutations[permutation][p].merge(byPermutation[p])
+        for pair in PAIRS:
+            self.pairs[pair].merge(other.pairs[pair])
+            self.blockPairs[pair].merge(other.blockPairs[pair])
+        for p in range(N_PLAYERS):
+            self.blocks[p].merge(other.blocks[p])
+            self.timeouts[p] += other.timeouts[p]
+
+    def summary(self, names):
+        """Return a one-line running summary (str) of each player's mean."""
+        return ', '.join('{} {} +/- {}'.format(names[p].strip(),
+                                              str(s.mean)[:5],
+                                              str(s.sem())[:4])
+                         for p, s in enumerate(self.players))
+
+    def breakdown(self, names):
+        """Return per-seat and per-permutation mean scores (list of str)."""
+        lines = ['BY SEAT (0 plays first, 1 bids first, 2 deals):']
+        for p in range(N_PLAYERS):
+            lines.append('{}, '.format(names[p]) +
+                         ', '.join('{} +/- {}'.format(str(s.mean)[:5],
+                                                      str(s.sem())[:4])
+                                   for s in self.seats[p]))
+        lines.append('BY PERMUTATION:')
+        for permutation in sorted(self.permutations):
+            byPermutation = self.permutations[permutation]
+            lines.append('{}: '.format(permutation) +
+                         ', '.join('{} {}'.format(names[p].strip(),
+                                                  str(stats.mean)[:5])
+                                   for p, stats in enumerate(byPermutation)))
+        return lines
+
+    def comparison(self, names, level=0.95):
+        """Return each pair's mean score difference and CI (list of str)."""
+        return ['PAIRED DIFFERENCES ({:g}% confidence interval):'
+                .format(100 * level)] + \
+               difference_lines(self.pairs, names, level)
+
+    def duplicate_comparison(self, names, level=0.95):
+        """Return each pair's mean difference over duplicate blocks and CI.
+
+        Differences are per round, like those of comparison(), but their
+        errors come from whole blocks.  Returns a list of str.
+        """
+        return ['DUPLICATE PAIRED DIFFERENCES ({} blocks, {:g}% confidence '
+                'interval):'.format(self.blocks[0].n, 100 * level)] + \
+               difference_lines(self.blockPairs, names, level)
+
+def difference_lines(pairs, names, level=0.95):
+    """Return a line per pair of players' RunningStats (dict, see PAIRS)."""
+    lines = []
+    for a, b in PAIRS:
+        stats = pairs[(a, b)]
+        low, high = confidence_interval(stats, level)
+        lines.append('{} - {}: {} +/- {} [{}, {}]'
+                     .format(names[a].strip(), names[b].strip(),
+                             str(stats.mean)[:5], str(stats.sem())[:4],
+                             str(low)[:5], str(high)[:5]))
+    return lines
+
+def advanced_report(board, names, level=0.95):
+    """Return Student-t intervals and paired t-tests (list of str).
+
+    Requires scipy, which is imported here rather than at module level.
+    """
+    from scipy import stats as scipyStats
+
+    lines = ['ADVANCED REPORT ({:g}% Student-t intervals):'
+             .format(100 * level)]
+    for p, stats in enumerate(board.players):
+        t = scipyStats.t.ppf(0.5 + level / 2, stats.n - 1)
+        halfWidth = t * stats.sem()
+        lines.append('{}, {:.3f} [{:.3f}, {:.3f}]'
+                     .format(names[p], stats.mean, stats.mean - halfWidth,
+                             stats.mean + halfWidth))
+    for a, b in PAIRS:
+        stats = board.pairs[(a, b)]
+        tStat = stats.mean / stats.sem()
+        pValue = 2 * scipyStats.t.sf(abs(tStat), stats.n - 1)
+        lines.append('{} - {}: t = {:.3f}, p = {:.3g}'
+                     .format(names[a].strip(), names[b].strip(), tStat,
+                             pValue))
+    return lines
@@ -3,92 +3,508 @@
 
 Command-line arguments (see usage):
   playeri: Name of the AI that will control each player
-  nRounds: Number of rounds to play
+  nRounds: Number of rounds to play (at most, with --target-sem)
   verbosity: How much output to show ('silent', only final average scores;
-    'scores', result of each round; 'verbose', play by play)
+    'scores', result of each round; 'verbose', play by play; 'json', every
+    event as a line of JSON, with the final scores sent to stderr)
+  --workers: Number of processes to spread the rounds over
+  --seed: Seed for the random number generator(s)
+  --first-round: Index of the first round to play (to re-run a round)
+  --duplicate: Play each deal in all six seat permutations and compare the
+    players block by block
+  --target-sem: Stop early once every player's mean score has a standard
+    error below this
+  --target-pairs: Apply --target-sem to the paired differences instead
+  --check-every: How often (in rounds) to check --target-sem
+  --report-every: Print running average scores every this many rounds
+  --breakdown: Also print average scores by seat and seating permutation
+  --compare: Also print paired score differences between players
+  --advanced: Also print a Student-t report (requires scipy)
+  --record: Append a binary record of every round to this file (see
+    game_record)
+  --instrument: Also print each player's decision latencies and the engine
+    operations per round (see instrumentation)
+  --profile: Write a cProfile profile of the run to this file
+  --move-time: Seconds a player may take per decision before the engine
+    moves for it
+  --round-time: Seconds each player may take in all per round
+  --concurrency: Play this many rounds at once with asyncio (see async_skat),
+    for remote players
+
+Every round gets its own seed, derived from --seed and its index (see
+round_seed()), so a seeded run plays the same rounds whatever the number of
+workers, and any one round can be re-run alone with --first-round and an
+n_rounds of 1.  The seed is printed with the results, drawn at random if not
+given.  (Players that stop thinking on a clock, like monty, can still vary,
+as can rounds where a player runs out of time.)
 """
 
+import argparse
+import contextlib
+import io
+import random
 import sys
-from scipy import stats, mean
 from play_skat import play_one_round
+from skat_classes import Round
+from skat_stats import ScoreBoard, advanced_report
 from kenny_player import KennyPlayer
 from silent_bob_player import SilentBobPlayer
 from nihilist_player import NihilistPlayer
 
 N_PLAYERS    = 3
 PERMUTATIONS = ((0,1,2), (0,2,1), (1,0,2), (1,2,0), (2,0,1), (2,1,0))
+ROUND_BITS   = 32 # Room for the round index in each round's seed
+CHUNKS_PER_WORKER = 4 # More, smaller chunks keep the workers evenly loaded.
+CHECK_EVERY  = 60 # Rounds between checks of --target-sem
+PLAYER_NAMES = ('kenny', 'bob', 'nihilist', 'monty') # Bundled players
+
+def parse_args():
+    """Parse and return the command-line arguments (argparse.Namespace)."""
+    parser = argparse.ArgumentParser(
+        description='Play rounds of skat between three AI players.')
+    for i in range(N_PLAYERS):
+        parser.add_argument('player{}'.format(i + 1),
+                            help='kenny, bob, nihilist, monty, or '
+                                 'remote:COMMAND')
+    parser.add_argument('n_rounds', type=int,
+                        help='positive integer (preferably a multiple of 6)')
+    parser.add_argument('verbosity',
+                        choices=('silent', 'scores', 'verbose', 'json'))
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of processes to play rounds in')
+    parser.add_argument('--seed', type=int,
+                        help='seed for reproducible runs (default: random)')
+    parser.add_argument('--first-round', type=int, default=0, metavar='I',
+                        help='start at round I (e.g. to re-run round I)')
+    parser.add_argument('--duplicate', action='store_true',
+                        help='play each deal in all 6 seat permutations')
+    parser.add_argument('--target-sem', type=float, metavar='S',
+                        help='stop once std. errs. are below S (n_rounds '
+                             'is then a budget)')
+    parser.add_argument('--target-pairs', action='store_true',
+                        help='check paired differences against S instead')
+    parser.add_argument('--check-every', type=int, default=CHECK_EVERY,
+                        metavar='K',
+                        help='check S every K rounds (a multiple of 6)')
+    parser.add_argument('--report-every', type=int, metavar='K',
+                        help='print running average scores every K rounds')
+    parser.add_argument('--breakdown', action='store_true',
+                        help='print average scores by seat and permutation')
+    parser.add_argument('--compare', action='store_true',
+                        help='print paired score differences between players')
+    parser.add_argument('--advanced', action='store_true',
+                        help='print t-intervals and paired t-tests (scipy)')
+    parser.add_argument('--record', metavar='FILE',
+                        help='append a binary record of each round to FILE')
+    parser.add_argument('--instrument', action='store_true',
+                        help='print decision latencies and engine operations')
+    parser.add_argument('--profile', metavar='FILE',
+                        help='write a cProfile profile of the run to FILE')
+    parser.add_argument('--move-time', type=float, metavar='S',
+                        help='seconds allowed per decision')
+    parser.add_argument('--round-time', type=float, metavar='S',
+                        help='seconds allowed per player per round')
+    parser.add_argument('--concurrency', type=int, metavar='N',
+                        help='keep N rounds in flight at once (asyncio)')
+    args = parser.parse_args()
+    if args.check_every <= 0 or args.check_every % len(PERMUTATIONS):
+        parser.error('--check-every must be a positive multiple of 6')
+    if args.concurrency is not None and (
+            args.concurrency <= 0 or args.workers > 1 or
+            args.verbosity in ('verbose', 'json') or
+            args.target_sem is not None or args.report_every or
+            args.instrument):
+        parser.error('--concurrency needs a positive N and silent or scores '
+                     'verbosity, and works without --workers, --target-sem, '
+                     '--report-every, and --instrument')
+    return args
+
+def make_player(name, seat, asynchronous=False):
+    """Instantiate and return a player.
 
-def usage():
-    """Print a standard Unix usage string."""
-    print('usage: {} player1 player2 player3 n_rounds verbosity'
-          .format(sys.argv[0]))
-    print('  playeri: kenny or bob')
-    print('  n_rounds: positive integer (preferably a multiple of 6)')
-    print('  verbosity: silent, scores, or verbose')
-    sys.exit(2)
-
-def make_player(name, seat):
-    """Instantiate and return a player."""
-    if name == 'kenny':
+    A name of the form 'remote:COMMAND' is a player in a bot process running
+    COMMAND, shared by every such player (see remote_player), with
+    coroutines for methods if asynchronous (see async_skat).
+    """
+    if name.startswith('remote:'):
+        # Only needed here; slow to import (threads, subprocesses)
+        from remote_player import RemotePlayer, AsyncRemotePlayer, connect
+        bot = connect(name[len('remote:'):])
+        if asynchronous:
+            return AsyncRemotePlayer(bot, seat)
+        return RemotePlayer(bot, seat)
+    elif name == 'kenny':
         return KennyPlayer(seat)
     elif name == 'bob':
         return SilentBobPlayer(seat)
     elif name == 'nihilist':
         return NihilistPlayer(seat)
+    elif name == 'monty':
+        from monty_player import MontyPlayer # Only needed here; slow to import
+        return MontyPlayer(seat)
+
+def short_name(name):
+    """Return the name to display for a player name (str).
+
+    A remote player is shown as 'remote', or 'remote-NAME' if its command
+    serves a bundled player NAME (e.g. './remote_player.py kenny').
+    """
+    if not name.startswith('remote:'):
+        return name
+    for word in name[len('remote:'):].split():
+        if word in PLAYER_NAMES:
+            return 'remote-' + word
+    return 'remote'
+
+def pretty_names(names):
+    """Return capitalized, distinct, equal-length display names (list)."""
+    # Capitalize player names.
+    names = [short_name(name) for name in names]
+    prettyNames = []
+    for i in range(N_PLAYERS):
+        prettyNames.append(names[i].capitalize())
+
+    # Resolve duplicate names by appending '1', '2', and '3' as needed.
+    if names[0] == names[1] == names[2]:
+        prettyNames = [prettyNames[i] + str(i + 1) for i in range(N_PLAYERS)]
+    else:
+        for pair in ((0,1), (0,2), (1,2)):
+            if names[pair[0]] == names[pair[1]]:
+                prettyNames[pair[0]] += '1'
+                prettyNames[pair[1]] += '2'
+
+    # Pad names for better verbose display.
+    longestName = ''
+    for name in prettyNames:
+        if len(name) > len(longestName):
+            longestName = name
+    for i in range(N_PLAYERS):
+        while len(prettyNames[i]) < len(longestName):
+            prettyNames[i] += ' '
+
+    return prettyNames
+
+def status_file(verbosity):
+    """Return where to print scores and progress (file object).
 
-if len(sys.argv) != 6:
-    usage()
-
-names = sys.argv[1 : 1 + N_PLAYERS]
-
-# Capitalize player names.
-prettyNames = []
-for i in range(N_PLAYERS):
-    prettyNames.append(names[i].capitalize())
-
-# Resolve duplicate names by appending '1', '2', and '3' as needed.
-if names[0] == names[1] == names[2]:
-    prettyNames = [prettyNames[i] + str(i + 1) for i in range(N_PLAYERS)]
-else:
-    for pair in ((0,1), (0,2), (1,2)):
-        if names[pair[0]] == names[pair[1]]:
-            prettyNames[pair[0]] += '1'
-            prettyNames[pair[1]] += '2'
-
-# Pad names for better verbose display.
-longestName = ''
-for name in prettyNames:
-    if len(name) > len(longestName):
-        longestName = name
-for i in range(N_PLAYERS):
-    while len(prettyNames[i]) < len(longestName):
-        prettyNames[i] += ' '
-
-# Ideally, to sample permutations evenly, should be a multiple of 3! = 6.
-nRounds = int(sys.argv[4])
-
-verbosity = sys.argv[5]
-
-# Play rounds.
-scores = [[], [], []]
-for i in range(nRounds):
-    if verbosity == 'verbose':
-        print('\n' + 'ROUND {}:'.format(i))
+    Anything but events is kept off stdout when it is a stream of JSON.
+    """
+    return sys.stderr if verbosity == 'json' else sys.stdout
+
+def report_progress(board, prettyNames, reportEvery, nRoundsBefore,
+                    out=sys.stdout):
+    """Print running averages if a multiple of reportEvery was just passed."""
+    if reportEvery and board.nRounds // reportEvery > \
+                       nRoundsBefore // reportEvery:
+        print('[{} rounds] {}'.format(board.nRounds,
+                                      board.summary(prettyNames)), file=out)
+        out.flush()
+
+def round_seed(seed, i):
+    """Return the seed (int) of round i of a run seeded with seed."""
+    return seed << ROUND_BITS | i
+
+def play_rounds(names, prettyNames, verbosity, start, stop, seed,
+                reportEvery=None, record=None, duplicate=False, until=None,
+                instruments=None, timeControl=(None, None)):
+    """Play rounds start to stop - 1 and return a ScoreBoard of the scores.
+
+    record (function): If given, called with the Round and its scores after
+      every round, e.g. to save it (see game_record).
+    duplicate (bool): Whether to play duplicate blocks: the six rounds of a
+      block of PERMUTATIONS share a seed, hence a deal, and complete blocks
+      are also recorded whole (see ScoreBoard.add_block()).
+    until (function): If given, called with the ScoreBoard after every
+      round; stops early if it returns True.
+    instruments (obj): If given, an instrumentation.Instruments to time the
+      players' decisions and count the engine's operations into.
+    timeControl (tuple): Seconds per decision and per round (see
+      Round.set_time_control()).
+    """
+    board = ScoreBoard()
+    # Instantiate players and a Round just once; play_one_round() resets them
+    # every round.
+    players = [make_player(name, i) for i, name in enumerate(names)]
+    if instruments is None:
+        r = Round(prettyNames, verbosity)
+    else:
+        players = instruments.wrap_players(players)
+        r = instruments.make_round(prettyNames, verbosity)
+    r.set_time_control(*timeControl)
+    block = [None, [0, 0, 0]] # See tally().
+    for i in range(start, stop):
+        if verbosity == 'verbose':
+            print('\n' + 'ROUND {}:'.format(i))
+        permutation = PERMUTATIONS[i % 6]
+        score = play_one_round([players[p] for p in permutation],
+                               [prettyNames[p] for p in permutation],
+                               verbosity, r,
+                               seed=round_seed(seed, i // len(PERMUTATIONS)
+                                               if duplicate else i))
+        tally(board, i, score, r.timeouts, duplicate, block)
+        if record is not None:
+            record(r, score)
+        report_progress(board, prettyNames, reportEvery, board.nRounds - 1,
+                        status_file(verbosity))
+        if until is not None and until(board):
+            break
+    return board
+
+def tally(board, i, score, timeouts, duplicate, block):
+    """Add round i's scores (list of int, by seat) to a ScoreBoard.
+
+    timeouts (list): The round's Round.timeouts.
+    duplicate (bool): See play_rounds().
+    block (list): The first round (int) of the current duplicate block and
+      each player's total score in it so far (list), updated in place.  The
+      block is added to the board once complete.
+    """
     permutation = PERMUTATIONS[i % 6]
-    ### TODO: necessary to re-instantiate players every round?
-    score = play_one_round([make_player(names[p], j) \
-                               for j, p in enumerate(permutation)],
-                           [prettyNames[p] for p in permutation],
-                           verbosity)
-    for j, p in enumerate(permutation):
-        scores[p].append(score[j])
-
-# Print average scores.
-if verbosity != 'silent':
-    print('')
-print('AVERAGE SCORES (+/- 1 std. err.):')
-for i in range(N_PLAYERS):
-    # stat.sem() throws a warning if nRounds is small.  No big deal.
-    print('{}, {} +/- {}'.format(prettyNames[i],
-                                 str(mean(scores[i]))[:5],
-                                 str(stats.sem(scores[i]))[:4] ))
+    board.add(permutation, score)
+    if timeouts:
+        board.add_timeouts(permutation, timeouts)
+    if duplicate:
+        position = i % len(PERMUTATIONS)
+        if position == 0:
+            block[:] = [i, [0, 0, 0]]
+        blockStart, totals = block
+        for seat, p in enumerate(permutation):
+            totals[p] += score[seat]
+        if position == len(PERMUTATIONS) - 1 and \
+           blockStart == i - position: # Skip a block begun before start.
+            board.add_block([total / len(PERMUTATIONS) for total in totals])
+
+def play_async(names, prettyNames, verbosity, start, stop, seed,
+               concurrency, writer=None, duplicate=False,
+               timeControl=(None, None)):
+    """Play rounds concurrently with asyncio; return a ScoreBoard.
+
+    Keeps up to concurrency (int) rounds in flight at once (see
+    async_skat), which pays off when the players are remote bots.  The
+    rounds, their results, and their output are the same as play_rounds()'s.
+
+    writer (obj): If given, a game_record.RecordWriter to save every round.
+    duplicate, timeControl: See play_rounds().
+    """
+    import asyncio # Only needed here
+    from async_skat import play_concurrently
+    from game_record import pack_round
+
+    rounds = [(PERMUTATIONS[i % 6],
+               round_seed(seed, i // len(PERMUTATIONS) if duplicate else i))
+              for i in range(start, stop)]
+    make_players = lambda: [make_player(name, i, asynchronous=True)
+                            for i, name in enumerate(names)]
+    results = asyncio.run(play_concurrently(
+        make_players, prettyNames, verbosity, rounds, concurrency,
+        timeControl, pack_round if writer is not None else None))
+
+    board = ScoreBoard()
+    block = [None, [0, 0, 0]]
+    for i, (score, timeouts, record) in zip(range(start, stop), results):
+        tally(board, i, score, timeouts, duplicate, block)
+        if writer is not None:
+            writer.write_records(record)
+    return board
+
+def play_chunk(job):
+    """Play one chunk of rounds in a worker process.
+
+    Returns the chunk's ScoreBoard along with its printed output and, if
+    recording, its packed game records (bytes), all of which the parent
+    process handles in order so that output doesn't interleave.  Also
+    returns the chunk's Instruments and ProfileStats, if asked for (else
+    None), for the parent to merge.
+    """
+    names, prettyNames, verbosity, start, stop, seed, recording, duplicate, \
+        instrumenting, profiling, timeControl = job
+    out = io.StringIO()
+    records = bytearray()
+    record, instruments, profile = None, None, None
+    if recording:
+        from game_record import pack_round # Only needed here
+        record = lambda r, score: records.extend(pack_round(r, score))
+    if instrumenting:
+        from instrumentation import Instruments # Only needed here
+        instruments = Instruments()
+    if profiling:
+        profile = make_profile()
+    with contextlib.redirect_stdout(out):
+        board = play_rounds(names, prettyNames, verbosity, start, stop, seed,
+                            record=record, duplicate=duplicate,
+                            instruments=instruments, timeControl=timeControl)
+    if profile is not None:
+        from instrumentation import ProfileStats # Only needed here
+        profile.disable()
+        profile = ProfileStats(profile)
+    return board, out.getvalue(), bytes(records), instruments, profile
+
+def make_profile():
+    """Return a cProfile.Profile, already profiling."""
+    import cProfile # Only needed here
+    profile = cProfile.Profile()
+    profile.enable()
+    return profile
+
+def chunk_bounds(first, stop, nWorkers, chunkSize=None):
+    """Return (start, stop) round ranges covering whole permutation blocks.
+
+    chunkSize (int): Rounds per range, a multiple of 6 (default: enough
+      ranges to share out).  Ranges end on multiples of it, so the first is
+      short if first isn't one, and no block is split between two ranges.
+    """
+    if chunkSize is None:
+        nBlocks = -(-(stop - first) // len(PERMUTATIONS)) # Round up
+        blocksPerChunk = max(1, nBlocks // (nWorkers * CHUNKS_PER_WORKER))
+        chunkSize = blocksPerChunk * len(PERMUTATIONS)
+    starts = [first] + list(range((first // chunkSize + 1) * chunkSize, stop,
+                                  chunkSize))
+    return list(zip(starts, starts[1:] + [stop]))
+
+def play_parallel(names, prettyNames, verbosity, first, stop, nWorkers, seed,
+                  reportEvery=None, writer=None, duplicate=False, until=None,
+                  chunkSize=None, instruments=None, profile=None,
+                  timeControl=(None, None)):
+    """Play rounds in a pool of processes; return the merged ScoreBoard.
+
+    writer (obj): If given, a game_record.RecordWriter to save every round.
+    duplicate, instruments, timeControl: See play_rounds().  The workers'
+      instruments are merged into instruments.
+    profile (obj): If given, a pstats.Stats to add the workers' profiles to.
+    until (function): Like play_rounds()'s, but called after every chunk of
+      chunkSize rounds (see chunk_bounds()).  Chunks already under way when
+      it returns True are thrown away.
+    """
+    jobs = [(names, prettyNames, verbosity, start, stop, seed,
+             writer is not None, duplicate, instruments is not None,
+             profile is not None, timeControl)
+            for start, stop in chunk_bounds(first, stop, nWorkers,
+                                            chunkSize)]
+    import multiprocessing # Only needed here; slow to import
+
+    board = ScoreBoard()
+    with multiprocessing.Pool(nWorkers) as pool:
+        for chunkBoard, out, records, chunkInstruments, chunkProfile \
+                in pool.imap(play_chunk, jobs): # Ordered
+            sys.stdout.write(out)
+            if writer is not None:
+                writer.write_records(records)
+            if instruments is not None:
+                instruments.merge(chunkInstruments)
+            if profile is not None:
+                profile.add(chunkProfile)
+            nRoundsBefore = board.nRounds
+            board.merge(chunkBoard)
+            report_progress(board, prettyNames, reportEvery, nRoundsBefore,
+                            status_file(verbosity))
+            if until is not None and until(board):
+                break
+    return board
+
+def main():
+    args = parse_args()
+    names = [args.player1, args.player2, args.player3]
+    prettyNames = pretty_names(names)
+
+    # Ideally, to sample permutations evenly, should be a multiple of 3! = 6.
+    nRounds = args.n_rounds
+
+    verbosity = args.verbosity
+    out = status_file(verbosity)
+
+    # Play rounds.
+    seed = args.seed
+    if seed is None:
+        seed = random.randrange(2**32)
+    first, stop = args.first_round, args.first_round + nRounds
+    writer = None
+    if args.record:
+        from game_record import RecordWriter # Only needed here
+        writer = RecordWriter(args.record)
+
+    # With a target, check it after every round whose index + 1 is a
+    # multiple of so many (where chunks end, see chunk_bounds()), the same
+    # ones however many workers there are, so that a seeded run still stops
+    # at the same round.
+    until, chunkSize = None, None
+    if args.target_sem is not None:
+        chunkSize = args.check_every
+        def until(board):
+            return (first + board.nRounds) % chunkSize == 0 and \
+                   board.settled(args.target_sem, args.target_pairs,
+                                 args.duplicate)
+
+    instruments = None
+    if args.instrument:
+        from instrumentation import Instruments # Only needed here
+        instruments = Instruments()
+    timeControl = (args.move_time, args.round_time)
+    if args.workers > 1:
+        # Profile the workers, where the rounds are played.
+        profile = None
+        if args.profile:
+            import pstats # Only needed here
+            profile = pstats.Stats()
+        board = play_parallel(names, prettyNames, verbosity, first, stop,
+                              args.workers, seed, args.report_every, writer,
+                              args.duplicate, until, chunkSize, instruments,
+                              profile, timeControl)
+    else:
+        profile = make_profile() if args.profile else None
+        if args.concurrency is not None:
+            board = play_async(names, prettyNames, verbosity, first, stop,
+                               seed, args.concurrency, writer,
+                               args.duplicate, timeControl)
+        else:
+            board = play_rounds(names, prettyNames, verbosity, first, stop,
+                                seed, args.report_every,
+                                writer.write if writer is not None else None,
+                                args.duplicate, until, instruments,
+                                timeControl)
+        if profile is not None:
+            profile.disable()
+    if writer is not None:
+        writer.close()
+    if profile is not None:
+        profile.dump_stats(args.profile)
+
+    # Print average scores.
+    if verbosity not in ('silent', 'json'):
+        print('')
+    # Rounds of a duplicate block share a deal, so only whole blocks are
+    # independent enough for a standard error.
+    averages = board.blocks if args.duplicate and board.blocks[0].n \
+               else board.players
+    print('AVERAGE SCORES (+/- 1 std. err.):', file=out)
+    for i in range(N_PLAYERS):
+        # The std. err. is nan if only one round was played.  No big deal.
+        print('{}, {} +/- {}'.format(prettyNames[i],
+                                     str(averages[i].mean)[:5],
+                                     str(averages[i].sem())[:4] ),
+              file=out)
+    if args.breakdown:
+        print('\n'.join(board.breakdown(prettyNames)), file=out)
+    if args.compare:
+        print('\n'.join(board.comparison(prettyNames)), file=out)
+    if args.duplicate:
+        print('\n'.join(board.duplicate_comparison(prettyNames)), file=out)
+    if args.target_sem is not None:
+        settled = board.settled(args.target_sem, args.target_pairs,
+                                args.duplicate)
+        print('ROUNDS PLAYED: {} of {} ({})'
+              .format(board.nRounds, nRounds,
+                      'target reached' if settled else 'budget exhausted'),
+              file=out)
+    if args.advanced:
+        print('\n'.join(advanced_report(board, prettyNames)), file=out)
+    if instruments is not None:
+        print('\n'.join(instruments.report(prettyNames)), file=out)
+    if timeControl != (None, None):
+        print('TIMEOUTS: {}'.format(', '.join(
+            '{} {}'.format(prettyNames[i].strip(), board.timeouts[i])
+            for i in range(N_PLAYERS))), file=out)
+    # Drawn if not given, so that any round can be re-run (see above).
+    print('SEED: {}'.format(seed), file=out)
+
+if __name__ == '__main__':
+    main()